@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import apply_pragmas
+        from .middleware import install_query_counter, install_template_timer
+        install_template_timer()
+        connection_created.connect(apply_pragmas)
+        connection_created.connect(install_query_counter)
@@ -0,0 +1,352 @@
+"""Общий для всех процессов кэш.
+
+Адрес кэша задаётся переменной окружения YATUBE_CACHE_URL:
+
+    redis://[:password@]host:6379/0       - RedisCache из этого модуля;
+    rediss://[:password@]host:6380/0      - то же через TLS;
+    memcached://host:11211[,host2:11211]  - PyMemcacheCache из Django;
+    пусто                                 - LocMemCache текущего процесса.
+
+RedisCache говорит на протоколе RESP напрямую и не требует клиентских
+библиотек; соединения берутся из общего для процесса пула.
+"""
+import pickle
+import queue
+import re
+import socket
+import ssl
+import threading
+from urllib.parse import unquote, urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+def cache_settings(url, key_prefix='', max_connections=50, timeout=300):
+    """Словарь для CACHES['default'] по адресу кэша."""
+    if not url:
+        return {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    scheme = urlparse(url).scheme
+    if scheme in ('redis', 'rediss'):
+        return {
+            'BACKEND': 'core.cache.RedisCache',
+            'LOCATION': url,
+            'KEY_PREFIX': key_prefix,
+            'TIMEOUT': timeout,
+            'OPTIONS': {'MAX_CONNECTIONS': max_connections},
+        }
+    if scheme == 'memcached':
+        return {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': url[len('memcached://'):].split(','),
+            'KEY_PREFIX': key_prefix,
+            'TIMEOUT': timeout,
+            'OPTIONS': {
+                'use_pooling': True,
+                'max_pool_size': max_connections,
+            },
+        }
+    raise ValueError(f'Неизвестная схема адреса кэша: {url}')
+
+
+class RedisError(Exception):
+    pass
+
+
+class Connection:
+    def __init__(self, host, port, db=0, password=None, timeout=None,
+                 tls=False):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if tls:
+            # Пароль и данные идут только после проверки сертификата.
+            self.sock = ssl.create_default_context().wrap_socket(
+                self.sock, server_hostname=host)
+        self.reader = self.sock.makefile('rb')
+        if password:
+            self.execute('AUTH', password)
+        if db:
+            self.execute('SELECT', db)
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    @staticmethod
+    def encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Соединение с кэшем закрыто')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise RedisError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise RedisError(f'Неожиданный ответ: {line!r}')
+
+    def pipeline(self, commands):
+        """Отправляет команды одним пакетом и читает все ответы.
+        Ошибки Redis возвращаются в списке, а не бросаются."""
+        self.sock.sendall(b''.join(self.encode(args) for args in commands))
+        replies = []
+        for _ in commands:
+            try:
+                replies.append(self.read_reply())
+            except RedisError as error:
+                replies.append(error)
+        return replies
+
+    def execute(self, *args):
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+
+class ConnectionPool:
+    """Пул соединений, общий для всех потоков процесса."""
+
+    def __init__(self, host, port, db=0, password=None, max_connections=50,
+                 timeout=None, tls=False):
+        self.connection_kwargs = {
+            'host': host,
+            'port': port,
+            'db': db,
+            'password': password,
+            'timeout': timeout,
+            'tls': tls,
+        }
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_connections:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if not create:
+            return self._idle.get(timeout=self.timeout)
+        try:
+            return Connection(**self.connection_kwargs)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, connection):
+        self._idle.put(connection)
+
+    def discard(self, connection):
+        connection.close()
+        with self._lock:
+            self._created -= 1
+
+    def disconnect(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(location, max_connections, timeout):
+    with _pools_lock:
+        pool = _pools.get(location)
+        if pool is None:
+            url = urlparse(location)
+            db = url.path.lstrip('/')
+            pool = _pools[location] = ConnectionPool(
+                host=url.hostname or 'localhost',
+                port=url.port or 6379,
+                db=int(db) if db else 0,
+                password=unquote(url.password) if url.password else None,
+                max_connections=max_connections,
+                timeout=timeout,
+                tls=url.scheme == 'rediss',
+            )
+        return pool
+
+
+class RedisCache(BaseCache):
+    def __init__(self, server, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._pool = get_pool(
+            server,
+            int(options.get('MAX_CONNECTIONS', 50)),
+            options.get('SOCKET_TIMEOUT', 5),
+        )
+
+    def _pipeline(self, commands):
+        connection = self._pool.acquire()
+        try:
+            replies = connection.pipeline(commands)
+        except (OSError, ConnectionError):
+            self._pool.discard(connection)
+            raise
+        self._pool.release(connection)
+        return replies
+
+    def _execute(self, *args):
+        reply = self._pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    @staticmethod
+    def _encode(value):
+        # Целые числа храним как есть, чтобы работал INCRBY.
+        if isinstance(value, int) and not isinstance(value, bool):
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def _milliseconds(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return int(timeout * 1000)
+
+    def _set_command(self, key, value, timeout, *flags):
+        command = ['SET', key, self._encode(value), *flags]
+        milliseconds = self._milliseconds(timeout)
+        if milliseconds is not None:
+            command += ['PX', max(milliseconds, 1)]
+        return command
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if self._milliseconds(timeout) == 0:
+            return False
+        return self._execute(*self._set_command(key, value, timeout, 'NX')) \
+            is not None
+
+    def get(self, key, default=None, version=None):
+        value = self._execute('GET', self._key(key, version))
+        return default if value is None else self._decode(value)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if self._milliseconds(timeout) == 0:
+            self._execute('DEL', key)
+            return
+        self._execute(*self._set_command(key, value, timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        milliseconds = self._milliseconds(timeout)
+        if milliseconds is None:
+            exists, _ = self._pipeline([('EXISTS', key), ('PERSIST', key)])
+            return bool(exists)
+        return bool(self._execute('PEXPIRE', key, max(milliseconds, 1)))
+
+    def delete(self, key, version=None):
+        return bool(self._execute('DEL', self._key(key, version)))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        backend_keys = [self._key(key, version) for key in keys]
+        values = self._execute('MGET', *backend_keys)
+        return {
+            key: self._decode(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        if self._milliseconds(timeout) == 0:
+            self.delete_many(data, version)
+            return []
+        commands = [
+            self._set_command(self._key(key, version), value, timeout)
+            for key, value in data.items()
+        ]
+        replies = self._pipeline(commands)
+        return [
+            key for key, reply in zip(data, replies)
+            if isinstance(reply, RedisError)
+        ]
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._execute('DEL', *keys)
+
+    def has_key(self, key, version=None):
+        return bool(self._execute('EXISTS', self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self._execute('EXISTS', key):
+            raise ValueError(f"Key '{key}' not found")
+        try:
+            return self._execute('INCRBY', key, delta)
+        except RedisError as error:
+            raise ValueError(str(error))
+
+    def clear(self):
+        """Удаляет только ключи этой инсталляции (KEY_PREFIX): в той же
+        базе Redis могут жить кэши других."""
+        # Спецсимволы шаблона MATCH в префиксе экранируются.
+        prefix = re.sub(r'([*?\[\]\\])', r'\\\1', self.key_prefix)
+        pattern = f'{prefix}:*'
+        cursor = b'0'
+        while True:
+            cursor, keys = self._execute(
+                'SCAN', cursor, 'MATCH', pattern, 'COUNT', 1000)
+            if keys:
+                self._execute('DEL', *keys)
+            if cursor == b'0':
+                return
@@ -0,0 +1,236 @@
+"""Профили настройки SQLite.
+
+Профиль выбирается переменной окружения YATUBE_DB_PROFILE:
+
+    пусто        - настройки SQLite по умолчанию, соединение на запрос;
+    production   - WAL (читатели не ждут писателя), synchronous=NORMAL,
+                   mmap и увеличенный кэш страниц, ожидание блокировки
+                   вместо ошибки database is locked и долгоживущие
+                   соединения.
+
+PRAGMA хранятся в ключе PRAGMAS настроек базы и выполняются для каждого
+нового соединения обработчиком сигнала connection_created.
+
+Реплики только для чтения перечисляются через запятую в YATUBE_DB_REPLICAS
+и получают псевдонимы replica_1, replica_2... ReplicaRouter отправляет на
+случайную реплику чтения view, обёрнутых в read_from_replica, а всё
+остальное - на основную базу. Пользователь, который что-то записал,
+получает cookie и ещё DB_PIN_SECONDS секунд читает с основной базы:
+реплика может отставать, а свою запись он должен увидеть сразу.
+
+Async view (posts/async_views.py) не обращаются к ORM из цикла событий:
+run_sync выполняет синхронный код в потоке пула со своим соединением,
+gather - несколько независимых вызовов одновременно. Соединения потоков
+пула не видят незакоммиченных данных чужих транзакций, поэтому async view
+тестируются в TransactionTestCase.
+"""
+import asyncio
+import random
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections
+
+PIN_COOKIE = 'db_pin'
+
+_routing = ContextVar('db_routing', default=None)
+
+PROFILES = {
+    '': {
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {},
+    },
+    'production': {
+        # Соединение живёт между запросами; Django закроет его, если
+        # оно старше CONN_MAX_AGE или сломалось.
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            # Ожидание блокировки модулем sqlite3, сек.
+            'timeout': 20,
+        },
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            # В WAL безопасно: при сбое питания теряется только последняя
+            # транзакция, база не портится.
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            # Отрицательное значение - размер в КиБ.
+            'cache_size': -64 * 1024,
+            'temp_store': 'MEMORY',
+            'busy_timeout': 20_000,
+        },
+    },
+}
+
+
+def sqlite_settings(name, profile=''):
+    """Словарь для DATABASES['default'] по пути к файлу и профилю."""
+    if profile not in PROFILES:
+        raise ValueError(f'Неизвестный профиль базы: {profile}')
+    config = PROFILES[profile]
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': config['CONN_MAX_AGE'],
+        'OPTIONS': dict(config.get('OPTIONS', {})),
+        'PRAGMAS': dict(config['PRAGMAS']),
+    }
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик connection_created: PRAGMA из настроек базы."""
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    # Напрямую через sqlite3: служебные запросы не должны попадать
+    # в счётчики запросов Django и метрики.
+    for name, value in pragmas.items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def replica_settings(paths, profile=''):
+    """Словари для DATABASES по списку путей к репликам через запятую.
+    В тестах реплики смотрят в тестовую основную базу."""
+    replicas = {}
+    for number, path in enumerate(filter(None, paths.split(',')), 1):
+        replicas[f'replica_{number}'] = {
+            **sqlite_settings(path.strip(), profile),
+            'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+        }
+    return replicas
+
+
+class Routing:
+    """Состояние маршрутизации на время запроса."""
+
+    def __init__(self, pinned=False):
+        # Пользователь недавно писал: реплика может не знать о записи.
+        self.pinned = pinned
+        # view разрешил читать с реплики.
+        self.replica = False
+        # В этом запросе была запись.
+        self.wrote = False
+
+
+def start_routing(request):
+    """Начинает маршрутизацию запроса; возвращает (Routing, токен)."""
+    routing = Routing(pinned=PIN_COOKIE in request.COOKIES)
+    return routing, _routing.set(routing)
+
+
+def finish_routing(token):
+    _routing.reset(token)
+
+
+def pin_to_primary():
+    """Отмечает запись, сделанную в обход роутера (например, отложенную),
+    чтобы пользователь какое-то время читал с основной базы."""
+    routing = _routing.get()
+    if routing is not None:
+        routing.wrote = True
+
+
+def _replica_routing(request):
+    """Routing запроса, если ему можно читать с реплики, иначе None."""
+    routing = _routing.get()
+    if (routing is None or routing.pinned or not settings.DATABASE_REPLICAS
+            or request.method not in ('GET', 'HEAD')):
+        return None
+    return routing
+
+
+def read_from_replica(view):
+    """Декоратор view (обычного или async): GET и HEAD читают с реплики,
+    если пользователь не закреплён за основной базой."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            routing = _replica_routing(request)
+            if routing is None:
+                return await view(request, *args, **kwargs)
+            await resolve_user(request)
+            routing.replica = True
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                routing.replica = False
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        routing = _replica_routing(request)
+        if routing is None:
+            return view(request, *args, **kwargs)
+        # Сессия и пользователь - с основной базы: свежая сессия после
+        # входа могла ещё не дойти до реплики.
+        request.user.is_authenticated
+        routing.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            routing.replica = False
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        replicas = settings.DATABASE_REPLICAS
+        if (routing is None or not routing.replica or routing.wrote
+                or not replicas):
+            # Явно, а не None: иначе Django возьмёт базу из подсказки
+            # instance, и связанные объекты прочитаются с реплики.
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными копированием.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def _close_connections(func):
+    @wraps(func)
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Поток пула не получает request_finished: без этого его
+            # соединение жило бы дольше CONN_MAX_AGE.
+            close_old_connections()
+
+    return call
+
+
+async def run_sync(func, *args, **kwargs):
+    """Вызывает синхронную func (ORM, кэш, шаблоны) из async view в потоке
+    пула. Контекст (маршрутизация, замеры запроса) передаётся в поток."""
+    return await sync_to_async(
+        _close_connections(func), thread_sensitive=False)(*args, **kwargs)
+
+
+async def gather(*calls):
+    """Выполняет независимые вызовы без аргументов одновременно, каждый
+    в своём потоке и соединении; возвращает их результаты по порядку."""
+    return await asyncio.gather(*(run_sync(call) for call in calls))
+
+
+async def resolve_user(request):
+    """Загружает пользователя из сессии вне цикла событий; после этого
+    request.user можно читать из async-кода."""
+    return await run_sync(partial(getattr, request.user, 'is_authenticated'))
@@ -0,0 +1,273 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Счётчики и гистограммы копятся в памяти процесса. Если задан каталог
+METRICS_DIR, каждый процесс (воркер gunicorn) не чаще раза в
+METRICS_FLUSH_INTERVAL секунд и при выходе записывает свои значения в
+отдельный файл этого каталога, а /metrics складывает файлы всех процессов.
+Файлы завершившихся воркеров остаются, поэтому счётчики не уменьшаются
+при перезапуске воркера; каталог очищают при деплое. Без METRICS_DIR
+/metrics показывает только процесс, который обработал запрос.
+
+Ошибка записи файла метрик попадает в лог, но не в запрос: метрики
+не должны ломать ответ или сигнал, выполненный после сохранения данных.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+logger = logging.getLogger(__name__)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f'{self.name}: ожидались метки {self.labels}, '
+                f'получены {tuple(labels)}')
+        return json.dumps([str(labels[name]) for name in self.labels])
+
+    def dump(self):
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labels': self.labels,
+            'values': dict(self.values),
+        }
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+
+class Histogram(Metric):
+    """Значение по меткам - счётчики корзин, затем сумма и количество."""
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            slots = self.values.get(key)
+            if slots is None:
+                slots = self.values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    slots[index] += 1
+                    break
+            slots[-2] += value
+            slots[-1] += 1
+        self.registry.changed()
+
+    def dump(self):
+        data = super().dump()
+        data['buckets'] = self.buckets
+        data['values'] = {
+            key: list(slots) for key, slots in self.values.items()}
+        return data
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.reset()
+
+    def reset(self):
+        # После fork потомок не должен повторно учитывать значения
+        # родителя: они уже есть в файле родительского процесса.
+        self.lock = threading.Lock()
+        # Файл процесса пишет один поток за раз.
+        self.flush_lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric.values.clear()
+        self.filename = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        self.flushed = time.monotonic()
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Метрика {metric.name} уже есть')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(),
+                  buckets=LATENCY_BUCKETS):
+        return self.register(
+            Histogram(self, name, documentation, labels, buckets))
+
+    def dump(self):
+        with self.lock:
+            return {name: metric.dump()
+                    for name, metric in self.metrics.items()}
+
+    def changed(self):
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not (settings.METRICS_DIR
+                and time.monotonic() - self.flushed >= interval):
+            return
+        # Файл уже пишет другой поток: значения попадут в следующий раз.
+        if self.flush_lock.acquire(blocking=False):
+            try:
+                self._flush()
+            finally:
+                self.flush_lock.release()
+
+    def flush(self):
+        with self.flush_lock:
+            self._flush()
+
+    def _flush(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        self.flushed = time.monotonic()
+        path = os.path.join(directory, self.filename)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(
+                dir=directory, prefix=f'.{self.filename}.', suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+                    json.dump(self.dump(), file)
+                os.replace(temporary, path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+        except OSError:
+            logger.exception('Не удалось записать метрики в %s', path)
+
+    def collect(self):
+        """Значения всех процессов: из METRICS_DIR или только текущего."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return self.dump()
+        self.flush()
+        merged = {}
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    dumped = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, data in dumped.items():
+                merge(merged, name, data)
+        return merged
+
+    def render(self):
+        return render(self.collect())
+
+
+def merge(merged, name, data):
+    target = merged.setdefault(name, {**data, 'values': {}})
+    for key, value in data['values'].items():
+        if key not in target['values']:
+            target['values'][key] = value
+        elif data['type'] == 'histogram':
+            target['values'][key] = [
+                a + b for a, b in zip(target['values'][key], value)]
+        else:
+            target['values'][key] += value
+
+
+def _format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in pairs)
+    return '{' + ','.join(
+        f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(collected):
+    """Текстовый формат Prometheus (version 0.0.4)."""
+    lines = []
+    for name in sorted(collected):
+        data = collected[name]
+        lines.append(f'# HELP {name} {data["help"]}')
+        lines.append(f'# TYPE {name} {data["type"]}')
+        for key in sorted(data['values']):
+            labels = json.loads(key)
+            value = data['values'][key]
+            if data['type'] != 'histogram':
+                lines.append(
+                    f'{name}{_format_labels(data["labels"], labels)} '
+                    f'{_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(data['buckets'], value):
+                cumulative += count
+                bucket_labels = _format_labels(
+                    data['labels'], labels, le=_format_value(bound))
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            bucket_labels = _format_labels(data['labels'], labels, le='+Inf')
+            lines.append(f'{name}_bucket{bucket_labels} {value[-1]}')
+            plain = _format_labels(data['labels'], labels)
+            lines.append(f'{name}_sum{plain} {_format_value(value[-2])}')
+            lines.append(f'{name}_count{plain} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+counter = registry.counter
+histogram = registry.histogram
+
+os.register_at_fork(after_in_child=registry.reset)
+atexit.register(registry.flush)
+
+REQUEST_SECONDS = histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по view.',
+    ('view', 'method'),
+)
+RESPONSES = counter(
+    'yatube_responses_total',
+    'Ответы по view и коду статуса.',
+    ('view', 'method', 'status'),
+)
+DB_QUERIES = histogram(
+    'yatube_db_queries_per_request',
+    'Запросы к БД на один ответ по view.',
+    ('view',),
+    buckets=COUNT_BUCKETS,
+)
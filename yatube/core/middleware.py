@@ -0,0 +1,288 @@
+"""Замер производительности запросов.
+
+Для доли запросов PERFORMANCE_SAMPLE_RATE считаются запросы к БД и их
+время, попадания и промахи кэша, время рендера шаблонов и полное время
+ответа. Итог пишется строкой JSON в лог core.performance и, если включён
+PERFORMANCE_SERVER_TIMING, в заголовок Server-Timing. Запросы вне выборки
+проходят без замеров: стоимость для них - один вызов random().
+
+Запросы к БД считает обёртка, которая ставится на каждое соединение при
+его создании и находит замеры текущего запроса через ContextVar: async
+view выполняют запросы в потоках пула, куда контекст передаётся вместе
+с вызовом. Все middleware модуля работают и под WSGI, и под ASGI.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.template.base import Template
+
+from . import metrics as app_metrics
+from .db import PIN_COOKIE, finish_routing, start_routing
+
+logger = logging.getLogger('core.performance')
+
+_current = ContextVar('request_metrics', default=None)
+_query_counter = ContextVar('query_counter', default=None)
+_original_render = Template.render
+_missing = object()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        self._template_depth = 0
+        self._cache_depth = 0
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def execute(self, execute, sql, params, many, context):
+        """Считает запрос к БД и его время."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def render(self, template, context):
+        # Вложенные шаблоны входят во время внешнего.
+        self._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return _original_render(template, context)
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template_time += time.perf_counter() - start
+
+    def instrument_cache(self, cache, stack):
+        """Считает попадания и промахи get/get_many на время запроса.
+        Экземпляр кэша у каждого потока свой, поэтому подмена методов
+        не влияет на другие запросы."""
+        get, get_many = cache.get, cache.get_many
+
+        def counted_get(key, default=None, version=None):
+            value = get(key, _missing, version=version)
+            # get_many некоторых бэкендов вызывает get для каждого ключа.
+            if not self._cache_depth:
+                if value is _missing:
+                    self.cache_misses += 1
+                else:
+                    self.cache_hits += 1
+            return default if value is _missing else value
+
+        def counted_get_many(keys, version=None):
+            keys = list(keys)
+            self._cache_depth += 1
+            try:
+                values = get_many(keys, version=version)
+            finally:
+                self._cache_depth -= 1
+            self.cache_hits += len(values)
+            self.cache_misses += len(keys) - len(values)
+            return values
+
+        cache.get, cache.get_many = counted_get, counted_get_many
+        stack.callback(vars(cache).pop, 'get_many')
+        stack.callback(vars(cache).pop, 'get')
+
+    def as_dict(self):
+        return {
+            'duration_ms': round(self.duration * 1000, 2),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_ms': round(self.template_time * 1000, 2),
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'total;dur={self.duration * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.db_queries} queries"',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ))
+
+
+def _render(template, context):
+    metrics = _current.get()
+    if metrics is None:
+        return _original_render(template, context)
+    return metrics.render(template, context)
+
+
+def _execute(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.queries += 1
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute(execute, sql, params, many, context)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """Обработчик connection_created: обёртка, считающая запросы."""
+    if _execute not in connection.execute_wrappers:
+        # В начало списка: execute_wrapper() снимает обёртки с конца.
+        connection.execute_wrappers.insert(0, _execute)
+
+
+def install_template_timer():
+    """Подключает замер рендера шаблонов; вызывается при загрузке
+    приложения core, до первого запроса."""
+    Template.render = _render
+
+
+class AsyncCapableMiddleware:
+    """Основа middleware, работающих и с синхронным, и с async
+    get_response. Наследники реализуют handle или ahandle."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.ahandle(request)
+        return self.handle(request)
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    def sample(self):
+        rate = settings.PERFORMANCE_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return None
+        return RequestMetrics()
+
+    @contextmanager
+    def measure(self, metrics):
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for cache in caches.all():
+                    metrics.instrument_cache(cache, stack)
+                yield
+        finally:
+            _current.reset(token)
+        metrics.finish()
+
+    def handle(self, request):
+        metrics = self.sample()
+        if metrics is None:
+            return self.get_response(request)
+        with self.measure(metrics):
+            response = self.get_response(request)
+        return self.report(request, response, metrics)
+
+    async def ahandle(self, request):
+        metrics = self.sample()
+        if metrics is None:
+            return await self.get_response(request)
+        with self.measure(metrics):
+            response = await self.get_response(request)
+        return self.report(request, response, metrics)
+
+    def report(self, request, response, metrics):
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **metrics.as_dict(),
+        }, ensure_ascii=False))
+        return response
+
+
+class QueryCounter:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """Время ответа, код и число запросов к БД каждого ответа - в метрики
+    по имени view (см. core/metrics.py)."""
+
+    def handle(self, request):
+        counter = QueryCounter()
+        token = _query_counter.set(counter)
+        try:
+            response = self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        return self.observe(request, response, counter)
+
+    async def ahandle(self, request):
+        counter = QueryCounter()
+        token = _query_counter.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _query_counter.reset(token)
+        return self.observe(request, response, counter)
+
+    def observe(self, request, response, counter):
+        elapsed = time.perf_counter() - counter.start
+        match = request.resolver_match
+        # Имя view, а не путь: число рядов метрики не растёт с числом URL.
+        view = (match.view_name if match else None) or 'unresolved'
+        app_metrics.REQUEST_SECONDS.observe(
+            elapsed, view=view, method=request.method)
+        app_metrics.RESPONSES.inc(
+            view=view, method=request.method, status=response.status_code)
+        app_metrics.DB_QUERIES.observe(counter.queries, view=view)
+        return response
+
+
+class ReplicaPinMiddleware(AsyncCapableMiddleware):
+    """Состояние ReplicaRouter на время запроса; после записи ставит
+    cookie, закрепляющую пользователя за основной базой (см. core/db.py).
+    """
+
+    def handle(self, request):
+        routing, token = start_routing(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            finish_routing(token)
+        return self.pin(response, routing)
+
+    async def ahandle(self, request):
+        routing, token = start_routing(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            finish_routing(token)
+        return self.pin(response, routing)
+
+    def pin(self, response, routing):
+        if routing.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DB_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,154 @@
+"""Минимальный Redis-совместимый сервер для тестов.
+
+Поддерживает только команды, которые использует core.cache.RedisCache,
+и живёт в потоке текущего процесса.
+"""
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name = args[0].decode().upper()
+            try:
+                reply = self.server.dispatch(name, args[1:])
+            except Exception as error:
+                reply = error
+            self.wfile.write(encode(reply))
+
+
+def encode(reply):
+    if isinstance(reply, Exception):
+        return b'-ERR %s\r\n' % str(reply).encode()
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, bool):
+        return b':%d\r\n' % reply
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, str):
+        return b'+%s\r\n' % reply.encode()
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    return b'*%d\r\n' % len(reply) + b''.join(encode(item) for item in reply)
+
+
+class RedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.data = {}
+        self.expires = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def dispatch(self, name, args):
+        with self.lock:
+            return getattr(self, f'cmd_{name.lower()}')(*args)
+
+    def cmd_ping(self):
+        return 'PONG'
+
+    def cmd_select(self, db):
+        return 'OK'
+
+    def cmd_get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def cmd_mget(self, *keys):
+        return [self.cmd_get(key) for key in keys]
+
+    def cmd_set(self, key, value, *flags):
+        flags = [flag.upper() if flag.isalpha() else flag for flag in flags]
+        if b'NX' in flags and self._alive(key):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if b'PX' in flags:
+            milliseconds = int(flags[flags.index(b'PX') + 1])
+            self.expires[key] = time.monotonic() + milliseconds / 1000
+        return 'OK'
+
+    def cmd_del(self, *keys):
+        deleted = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                deleted += 1
+        return deleted
+
+    def cmd_exists(self, *keys):
+        return sum(self._alive(key) for key in keys)
+
+    def cmd_incrby(self, key, delta):
+        value = int(self.data[key]) if self._alive(key) else 0
+        value += int(delta)
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_pexpire(self, key, milliseconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def cmd_persist(self, key):
+        return int(self.expires.pop(key, None) is not None)
+
+    def cmd_scan(self, cursor, *options):
+        # Все подходящие ключи за один вызов: курсор сразу равен 0.
+        options = dict(zip(options[::2], options[1::2]))
+        pattern = options.get(b'MATCH', b'*').decode()
+        keys = [key for key in list(self.data)
+                if self._alive(key) and fnmatch.fnmatchcase(
+                    key.decode(), pattern)]
+        return [b'0', keys]
+
+    def cmd_flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return 'OK'
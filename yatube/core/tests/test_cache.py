@@ -0,0 +1,169 @@
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+from ..cache import RedisCache, cache_settings, get_pool
+from .redis_server import RedisServer
+
+User = get_user_model()
+
+
+class CacheSettingsTests(SimpleTestCase):
+    def test_backend_selected_by_url(self):
+        """Бэкенд кэша выбирается по схеме YATUBE_CACHE_URL."""
+        backends = {
+            '': 'django.core.cache.backends.locmem.LocMemCache',
+            'redis://cache:6379/1': 'core.cache.RedisCache',
+            'rediss://cache:6380/1': 'core.cache.RedisCache',
+            'memcached://a:11211,b:11211': (
+                'django.core.cache.backends.memcached.PyMemcacheCache'),
+        }
+        for url, backend in backends.items():
+            with self.subTest(url=url):
+                self.assertEqual(cache_settings(url)['BACKEND'], backend)
+
+    def test_memcached_uses_pooling_and_prefix(self):
+        config = cache_settings(
+            'memcached://a:11211,b:11211', key_prefix='prod',
+            max_connections=8)
+        self.assertEqual(config['LOCATION'], ['a:11211', 'b:11211'])
+        self.assertEqual(config['KEY_PREFIX'], 'prod')
+        self.assertEqual(config['OPTIONS']['max_pool_size'], 8)
+
+
+class RedisCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = RedisServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        get_pool(cls.server.url, 0, 0).disconnect()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = self.make_cache('deploy')
+        self.cache.clear()
+
+    def make_cache(self, key_prefix, max_connections=4):
+        return RedisCache(self.server.url, {
+            'KEY_PREFIX': key_prefix,
+            'OPTIONS': {'MAX_CONNECTIONS': max_connections},
+        })
+
+    def test_basic_operations(self):
+        """Основные операции кэша работают через протокол Redis."""
+        self.cache.set('post', {'id': 1, 'text': 'Текст'})
+        self.assertEqual(self.cache.get('post'), {'id': 1, 'text': 'Текст'})
+        self.assertIsNone(self.cache.get('missing'))
+        self.assertFalse(self.cache.add('post', 'другое'))
+        self.assertTrue(self.cache.add('new', 'значение'))
+        self.assertTrue(self.cache.has_key('new'))
+        self.assertTrue(self.cache.delete('new'))
+        self.assertFalse(self.cache.has_key('new'))
+
+    def test_many_and_incr(self):
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2]})
+        self.assertEqual(self.cache.incr('a', 10), 11)
+        self.assertEqual(self.cache.decr('a'), 10)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_timeout(self):
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('forever', 1, timeout=None)
+        self.assertTrue(self.cache.touch('forever', None))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 1)
+
+    def test_key_prefix_separates_deployments(self):
+        other = self.make_cache('staging')
+        self.cache.set('key', 'prod')
+        other.set('key', 'staging')
+        self.assertEqual(self.cache.get('key'), 'prod')
+        self.assertEqual(other.get('key'), 'staging')
+
+    def test_clear_keeps_other_deployments(self):
+        other = self.make_cache('staging')
+        self.cache.set_many({'first': 1, 'second': 2})
+        other.set('first', 'staging')
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(['first', 'second']), {})
+        self.assertEqual(other.get('first'), 'staging')
+
+    def test_state_shared_between_cache_instances(self):
+        """Разные экземпляры (как разные воркеры) видят одни данные,
+        а clear() действует на всех."""
+        worker = self.make_cache('deploy')
+        self.cache.set('page', 'html')
+        self.assertEqual(worker.get('page'), 'html')
+        worker.clear()
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_rediss_wraps_socket_in_tls(self):
+        host, port = self.server.server_address
+        pool = get_pool(f'rediss://{host}:{port}/0', 1, 1)
+        with mock.patch('ssl.create_default_context') as context:
+            wrap_socket = context.return_value.wrap_socket
+            wrap_socket.side_effect = lambda sock, server_hostname: sock
+            pool.discard(pool.acquire())
+        wrap_socket.assert_called_once_with(mock.ANY, server_hostname=host)
+
+    def test_connections_are_pooled(self):
+        connections_before = self.server.connections
+
+        def work():
+            for i in range(20):
+                self.cache.set(f'key{i}', i)
+                self.cache.get(f'key{i}')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(
+            self.server.connections - connections_before, 4)
+
+
+class FeedCacheOnRedisTests(TestCase):
+    """Кэш лент работает поверх общего Redis-совместимого кэша."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = RedisServer().start()
+        cls.settings_override = override_settings(CACHES={
+            'default': cache_settings(cls.server.url, key_prefix='test'),
+        })
+        cls.settings_override.enable()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        get_pool(cls.server.url, 0, 0).disconnect()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def test_index_cached_and_invalidated(self):
+        self.assertIsInstance(caches['default'], RedisCache)
+        client = Client()
+        Post.objects.create(author=self.user, text='Первый пост')
+        self.assertContains(client.get(reverse('posts:index')), 'Первый')
+        self.assertTrue(self.server.data)
+
+        Post.objects.create(author=self.user, text='Второй пост')
+        self.assertContains(client.get(reverse('posts:index')), 'Второй')
@@ -0,0 +1,90 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, router
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from posts.models import Post
+
+from ..db import PIN_COOKIE, read_from_replica, sqlite_settings
+from ..middleware import ReplicaPinMiddleware
+
+
+class SqliteProfileTests(SimpleTestCase):
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            sqlite_settings('db.sqlite3', 'fast')
+
+    def test_production_pragmas_applied_on_connect(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = {
+                **connection.settings_dict,
+                **sqlite_settings(
+                    os.path.join(directory, 'db.sqlite3'), 'production'),
+            }
+            wrapper = DatabaseWrapper(database, alias='production')
+            wrapper.force_debug_cursor = True
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    journal_mode = cursor.fetchone()[0]
+                    cursor.execute('PRAGMA busy_timeout')
+                    busy_timeout = cursor.fetchone()[0]
+                # PRAGMA профиля не попадают в журнал запросов Django.
+                self.assertEqual(len(wrapper.queries_log), 2)
+            finally:
+                wrapper.close()
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(busy_timeout, 20_000)
+
+
+@read_from_replica
+def feed_view(request):
+    read_from = router.db_for_read(Post)
+    if request.method == 'POST':
+        router.db_for_write(Post)
+    return HttpResponse(f'{read_from}|{router.db_for_read(Post)}')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaPinMiddleware(feed_view)
+
+    def request(self, method='get', **cookies):
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies)
+        request.user = AnonymousUser()
+        return request
+
+    def test_get_reads_from_replica(self):
+        response = self.middleware(self.request())
+        self.assertEqual(response.content, b'replica_1|replica_1')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_pins_to_primary(self):
+        response = self.middleware(self.request('post'))
+        self.assertEqual(response.content, b'default|default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response = self.middleware(self.request(**{PIN_COOKIE: '1'}))
+        self.assertEqual(response.content, b'default|default')
+
+    def test_reads_after_write_in_request_go_to_primary(self):
+        @read_from_replica
+        def view(request):
+            router.db_for_write(Post)
+            return HttpResponse(router.db_for_read(Post))
+
+        response = ReplicaPinMiddleware(view)(self.request())
+        self.assertEqual(response.content, b'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_other_views_and_no_replicas(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+        with override_settings(DATABASE_REPLICAS=[]):
+            response = self.middleware(self.request())
+        self.assertEqual(response.content, b'default|default')
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post
+
+from ..metrics import Registry, render
+
+User = get_user_model()
+
+
+class RegistryTests(SimpleTestCase):
+    def test_histogram_text_format(self):
+        metrics = Registry()
+        latency = metrics.histogram(
+            'latency_seconds', 'Задержка.', ('view',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 3):
+            latency.observe(value, view='posts:index')
+        text = render(metrics.dump())
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        for line in (
+            'latency_seconds_bucket{view="posts:index",le="0.1"} 1',
+            'latency_seconds_bucket{view="posts:index",le="1"} 2',
+            'latency_seconds_bucket{view="posts:index",le="+Inf"} 3',
+            'latency_seconds_sum{view="posts:index"} 3.55',
+            'latency_seconds_count{view="posts:index"} 3',
+        ):
+            self.assertIn(line, text)
+
+    def test_labels_must_match(self):
+        metrics = Registry()
+        requests = metrics.counter('requests_total', 'Ответы.', ('view',))
+        with self.assertRaises(ValueError):
+            requests.inc(path='/')
+
+    def test_workers_are_summed_through_directory(self):
+        """Каждый воркер пишет свой файл, /metrics складывает все."""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            workers = [Registry(), Registry()]
+            for amount, metrics in zip((2, 3), workers):
+                metrics.counter('posts_total', 'Посты.').inc(amount)
+            workers[0].flush()
+            text = render(workers[1].collect())
+        self.assertIn('posts_total 5', text)
+
+    def test_concurrent_flushes(self):
+        """Потоки, одновременно записывающие файл, не мешают друг другу."""
+        errors = []
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory,
+                                  METRICS_FLUSH_INTERVAL=0):
+            metrics = Registry()
+            posts = metrics.counter('posts_total', 'Посты.')
+
+            def work():
+                for _ in range(100):
+                    try:
+                        posts.inc()
+                    except Exception as error:
+                        errors.append(error)
+
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Последние значения могли пропустить занятую запись.
+            metrics.flush()
+            text = render(Registry().collect())
+            leftovers = [
+                name for name in os.listdir(directory)
+                if name.endswith('.tmp')]
+        self.assertEqual(errors, [])
+        self.assertIn('posts_total 800', text)
+        self.assertEqual(leftovers, [])
+
+    def test_write_error_is_logged(self):
+        with tempfile.NamedTemporaryFile() as file, \
+                override_settings(METRICS_DIR=file.name,
+                                  METRICS_FLUSH_INTERVAL=0), \
+                self.assertLogs('core.metrics', 'ERROR'):
+            Registry().counter('posts_total', 'Посты.').inc()
+
+
+class MetricsViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def value(self, text, series):
+        for line in text.splitlines():
+            if line.startswith(series + ' '):
+                return float(line.rsplit(' ', 1)[1])
+        return 0
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_view_metrics_are_exposed(self):
+        # Вошедшему читателю страница рендерится, фрагмент ленты - из кэша.
+        self.client.force_login(self.user)
+        before = self.scrape()
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        after = self.scrape()
+
+        for series, delta in (
+            ('yatube_posts_created_total', 1),
+            ('yatube_responses_total{view="posts:index",method="GET",'
+             'status="200"}', 2),
+            ('yatube_request_duration_seconds_count{view="posts:index",'
+             'method="GET"}', 2),
+            ('yatube_db_queries_per_request_count{view="posts:index"}', 2),
+            ('yatube_feed_cache_requests_total{cache="index_page",'
+             'result="miss"}', 1),
+            ('yatube_feed_cache_requests_total{cache="index_page",'
+             'result="hit"}', 1),
+        ):
+            with self.subTest(series=series):
+                self.assertEqual(
+                    self.value(after, series) - self.value(before, series),
+                    delta)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_set(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
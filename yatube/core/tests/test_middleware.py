@@ -0,0 +1,53 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Post
+
+User = get_user_model()
+
+
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get_logged(self, url):
+        with self.assertLogs('core.performance', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, json.loads(logs.records[0].getMessage()), queries
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1)
+    def test_sampled_request_is_measured(self):
+        url = reverse('posts:index')
+        response, record, queries = self.get_logged(url)
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['db_queries'], len(queries))
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        # Повторный запрос берёт страницу из кэша.
+        _, record, _ = self.get_logged(url)
+        self.assertEqual(record['cache_misses'], 0)
+        self.assertGreater(record['cache_hits'], 0)
+        # После ответа у кэша снова обычные методы.
+        self.assertNotIn('get', vars(caches['default']))
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_request_outside_sample_is_not_measured(self):
+        with self.assertNoLogs('core.performance', 'INFO'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
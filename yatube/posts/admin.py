@@ -1,9 +1,18 @@
 from django.contrib import admin
 
 from .models import Comment, Follow, Group, Post
+from .paginator import EstimatedCountPaginator
+from .search import get_search
 
 
-class PostAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """Списки больших таблиц: оценка числа строк вместо COUNT(*)
+    и без второго COUNT(*) по всей таблице при поиске и фильтрах."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,11 +20,28 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group'
     )
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(
+            db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Группа редактируется в каждой строке списка: варианты
+            # читаются один раз, а не отдельным запросом на строку.
+            formfield.choices = list(formfield.choices)
+        return formfield
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE '%...%'.
+        if not search_term:
+            return queryset, False
+        return get_search().search(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = (
@@ -26,22 +52,28 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = (
         'post',
         'author',
         'text',
     )
-    search_fields = ('author',)
+    list_select_related = ('post', 'author')
+    # Точное совпадение имени идёт по уникальному индексу username.
+    search_fields = ('author__username__exact',)
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author',
     )
-    search_fields = ('author',)
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username__exact', 'author__username__exact')
+    autocomplete_fields = ('user', 'author')
     empty_value_display = '-пусто-'
 
 
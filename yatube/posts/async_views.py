@@ -0,0 +1,156 @@
+"""Async-версии лент для ASGI (yatube/asgi.py).
+
+Шаблоны и контекст - как у view из views.py. Независимые запросы
+страницы выполняются одновременно (core.db.gather), рендер, где карточки
+и миниатюры читают кэш и базу, - в потоке пула: цикл событий не ждёт базу
+и за это время обслуживает другие запросы.
+"""
+from django.contrib.auth.models import User
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.shortcuts import get_object_or_404, render
+
+from core.db import gather, read_from_replica, resolve_user, run_sync
+from yatube.settings import FEED_CACHE_TIMEOUT
+
+from . import caching
+from .conditional import (conditional_page, group_scopes, index_scopes,
+                          post_scopes, profile_scopes)
+from .forms import CommentForm
+from .models import AuthorStats, Follow, Group, Post
+from .timeline import timeline_post_ids
+from .views import comments_page, include_paginator
+from .writebehind import wait_written
+
+
+def load_page(request, fragment_name, feed_version, post_list, count=None):
+    """Страница ленты с уже загруженными постами. Если фрагмент ленты
+    есть в кэше, шаблону посты не нужны и страница остаётся ленивой."""
+    page_obj = include_paginator(request, post_list, count=count)
+    key = make_template_fragment_key(
+        fragment_name, [feed_version, request.GET.urlencode()])
+    if key not in cache:
+        len(page_obj)
+    return page_obj
+
+
+def feed_page(request, fragment_name, scopes, post_list):
+    """Версия ленты и её страница."""
+    feed_version = caching.feed_version(*scopes)
+    return feed_version, load_page(
+        request, fragment_name, feed_version, post_list)
+
+
+def loaded(page):
+    len(page)
+    return page
+
+
+async def written(request):
+    """wait_written, если в адресе есть метка отложенной записи."""
+    token = request.GET.get('written')
+    if token:
+        await run_sync(wait_written, token)
+
+
+@read_from_replica
+@conditional_page(index_scopes, feed=True)
+async def index(request):
+    feed_version, page_obj = await run_sync(
+        feed_page, request, 'index_page', [('global',)],
+        Post.objects.for_feed())
+    context = {
+        'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=True),
+        'feed_version': feed_version,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+    return await run_sync(render, request, 'posts/index.html', context)
+
+
+@read_from_replica
+@conditional_page(group_scopes, feed=True)
+async def group_posts(request, slug):
+    group = await run_sync(get_object_or_404, Group, slug=slug)
+    feed_version, page_obj = await run_sync(
+        feed_page, request, 'group_page', [('group', group.id)],
+        group.posts.for_feed())
+    context = {
+        'group': group,
+        'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=False),
+        'feed_version': feed_version,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+    return await run_sync(render, request, 'posts/group_list.html', context)
+
+
+@read_from_replica
+@conditional_page(profile_scopes, feed=True)
+async def profile(request, username):
+    await written(request)
+    author = await run_sync(get_object_or_404, User, username=username)
+    count_posts, following, (feed_version, page_obj) = await gather(
+        lambda: AuthorStats.get_posts_count(author.id),
+        lambda: request.user.is_authenticated and Follow.objects.filter(
+            user=request.user, author=author).exists(),
+        lambda: feed_page(
+            request, 'profile_page', [('author', author.id)],
+            author.posts.for_feed()),
+    )
+    context = {
+        'author': author,
+        'count_posts': count_posts,
+        'page_obj': page_obj,
+        'post_cards': caching.PostCards(
+            page_obj, template='posts/includes/profile_card.html'),
+        'following': following,
+        'feed_version': feed_version,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+    return await run_sync(render, request, 'posts/profile.html', context)
+
+
+@read_from_replica
+@conditional_page(post_scopes)
+async def post_detail(request, post_id):
+    await written(request)
+    post = await run_sync(
+        get_object_or_404, Post.objects.select_related('author', 'group'),
+        id=post_id)
+    count_posts, comments = await gather(
+        lambda: AuthorStats.get_posts_count(post.author_id),
+        lambda: loaded(comments_page(post_id, request.GET.get('cursor'))),
+    )
+    context = {
+        'count_posts': count_posts,
+        'post': post,
+        'form': CommentForm(request.POST or None),
+        'comments': comments,
+    }
+    return await run_sync(render, request, 'posts/post_detail.html', context)
+
+
+async def follow_index(request):
+    if not await resolve_user(request):
+        return redirect_to_login(request.get_full_path())
+    user_id = request.user.id
+    post_ids, feed_version = await gather(
+        lambda: timeline_post_ids(user_id),
+        lambda: caching.feed_version(('global',), ('follow', user_id)),
+    )
+    if post_ids is None:
+        post_list = Post.objects.for_feed().filter(
+            author__following__user_id=user_id)
+    else:
+        post_list = Post.objects.for_feed().filter(id__in=post_ids)
+    page_obj = await run_sync(
+        load_page, request, 'follow_page', feed_version, post_list)
+    context = {
+        'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=True),
+        'feed_version': feed_version,
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+    return await run_sync(render, request, 'posts/follow.html', context)
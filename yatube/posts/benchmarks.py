@@ -0,0 +1,138 @@
+"""Общие помощники для команд-бенчмарков (bench_*).
+
+Бенчмарки работают во временной тестовой базе и никогда не трогают
+рабочие данные.
+"""
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.template.base import Template
+from django.test.utils import CaptureQueriesContext
+
+from .models import Group, Post
+
+User = get_user_model()
+
+
+@contextmanager
+def isolated_database(verbosity=0, name=None):
+    """Создаёт тестовую БД на время бенчмарка и удаляет её после.
+    name - путь к файлу базы: SQLite в памяти не годится для нескольких
+    пишущих потоков и не поддерживает WAL."""
+    test_settings = connection.settings_dict['TEST']
+    old_name = connection.settings_dict['NAME']
+    old_test_name = test_settings['NAME']
+    if name:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False)
+    cache.clear()
+    try:
+        yield
+    finally:
+        cache.clear()
+        connection.creation.destroy_test_db(old_name, verbosity)
+        test_settings['NAME'] = old_test_name
+
+
+def seed(posts=1000, authors=50, groups=10, text_size=500, batch_size=5000):
+    """Заполняет базу постами; возвращает (authors, groups)."""
+    User.objects.bulk_create(
+        User(username=f'bench_author_{i}', first_name='Автор',
+             last_name=str(i))
+        for i in range(authors)
+    )
+    users = list(User.objects.filter(username__startswith='bench_author_'))
+    Group.objects.bulk_create(
+        Group(title=f'Группа {i}', slug=f'bench-{i}', description='')
+        for i in range(groups)
+    )
+    group_list = list(Group.objects.filter(slug__startswith='bench-'))
+    text = ('Текст поста для бенчмарка. ' * (text_size // 27 + 1))[:text_size]
+    batch = []
+    for i in range(posts):
+        batch.append(Post(
+            author=users[i % len(users)],
+            group=group_list[i % len(group_list)] if group_list else None,
+            text=f'{i}\n{text}',
+        ))
+        if len(batch) >= batch_size:
+            Post.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Post.objects.bulk_create(batch)
+    return users, group_list
+
+
+@contextmanager
+def timed_templates():
+    """Считает время рендера шаблонов в текущем потоке. Вложенные
+    шаблоны ({% include %}, карточки) входят во время внешнего."""
+    original = Template.render
+    state = threading.local()
+
+    def render(self, context):
+        depth = getattr(state, 'depth', 0)
+        state.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            state.depth = depth
+            if depth == 0:
+                state.total = (getattr(state, 'total', 0)
+                               + time.perf_counter() - start)
+
+    Template.render = render
+    try:
+        yield state
+    finally:
+        Template.render = original
+
+
+def profile_call(func, templates):
+    """Вызывает func и возвращает (результат, время в секундах,
+    число запросов к БД, время рендера шаблонов в секундах)."""
+    templates.total = 0
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+    return result, elapsed, len(queries), templates.total
+
+
+def measure(func, repeat):
+    """Время выполнения func в секундах для каждого из repeat запусков."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(timings, percent):
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def summary(timings):
+    """Сводка в миллисекундах."""
+    return {
+        'mean': statistics.mean(timings) * 1000,
+        'p50': percentile(timings, 50) * 1000,
+        'p95': percentile(timings, 95) * 1000,
+        'p99': percentile(timings, 99) * 1000,
+    }
+
+
+def format_summary(name, timings):
+    stats = summary(timings)
+    return (f'{name}: mean {stats["mean"]:.2f} ms, '
+            f'p50 {stats["p50"]:.2f} ms, p95 {stats["p95"]:.2f} ms')
@@ -0,0 +1,137 @@
+"""Версионированные ключи кэша лент.
+
+Каждая лента зависит от счётчиков поколений: общего ('global'), группы,
+автора и подписок пользователя. Сигналы Post и Follow увеличивают нужные
+счётчики, поэтому фрагменты можно хранить долго: после изменения данных
+шаблон просто читает ключ нового поколения. Вместе со счётчиком bump
+обновляет время изменения области в LastModified (см. posts/conditional.py).
+
+Карточки постов кэшируются отдельно, по id, дате и версии поста, и собираются
+в страницу одним get_many.
+
+Комментарии меняют только область поста: при всплеске комментариев
+сброс лент на каждый из них сводил бы кэш лент на нет. Карточка с новым
+числом комментариев рендерится сразу (меняется версия поста), а ленты
+с ней - со сменой окна counts_window.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .metrics import FEED_CACHE
+from .models import LastModified
+
+GENERATION_PREFIX = 'feed_gen'
+# Поколение, общее для всех лент: bump_all сбрасывает их разом.
+EPOCH = ('epoch',)
+
+
+def generation_key(scope, obj_id=None):
+    if obj_id is None:
+        return f'{GENERATION_PREFIX}:{scope}'
+    return f'{GENERATION_PREFIX}:{scope}:{obj_id}'
+
+
+def _initial_generation():
+    # Если счётчик вытеснен из кэша, новое значение не должно совпасть
+    # со старым, иначе всплывут устаревшие фрагменты.
+    return int(time.time() * 1000)
+
+
+def feed_version(*scopes):
+    """Строка версии ленты по списку (scope, obj_id)."""
+    keys = [generation_key(*scope) for scope in (EPOCH, *scopes)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _initial_generation(), None)
+            generations[key] = cache.get(key)
+    versions = [f'{key}={generations[key]}' for key in keys]
+    return '|'.join([*versions, f'counts={counts_window()}'])
+
+
+def counts_window():
+    """Начало текущего окна COMMENT_COUNT_MAX_AGE, unix-время."""
+    max_age = settings.COMMENT_COUNT_MAX_AGE
+    return int(time.time()) // max_age * max_age
+
+
+def bump(*scopes):
+    """Сбрасывает кэш областей и отмечает время их изменения."""
+    LastModified.touch(*scopes)
+    for scope in scopes:
+        _incr_generation(scope)
+
+
+def bump_all():
+    """Сбрасывает кэш всех лент и страниц, например после import_data:
+    меняется поколение EPOCH, которое входит в версию каждой ленты, и
+    время изменения всех областей. Области без строки в LastModified
+    (их ещё ни разу не меняли) не получают новой отметки, и их страница
+    в кэше анонимных читателей живёт до PAGE_CACHE_TIMEOUT."""
+    LastModified.touch_all()
+    _incr_generation(EPOCH)
+    _incr_generation(('global',))
+
+
+def _incr_generation(scope):
+    key = generation_key(*scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_generation(), None)
+
+
+def bump_post_feeds(author_id, *group_ids, post_id=None):
+    scopes = [('global',), ('author', author_id)]
+    scopes += [('group', group_id) for group_id in set(group_ids) if group_id]
+    if post_id is not None:
+        scopes.append(('post', post_id))
+    bump(*scopes)
+
+
+class PostCards:
+    """Отрендеренные карточки постов страницы. Вычисляются лениво, при
+    первом обходе, поэтому при попадании в кэш ленты не делают ничего."""
+
+    def __init__(self, page_obj, template='posts/includes/content.html',
+                 **context):
+        self.page_obj = page_obj
+        self.template = template
+        self.context = context
+
+    def key(self, post):
+        variant = '|'.join(
+            f'{name}={value}' for name, value in sorted(self.context.items()))
+        # Автор и группа в карточке меняются без изменения поста; их поля
+        # загружены for_feed(). md5 - имена могут содержать пробелы.
+        author, group = post.author, post.group
+        related = hashlib.md5(
+            f'{author.username}|{author.first_name}|{author.last_name}|'
+            f'{group.slug if group else ""}'.encode()).hexdigest()
+        # pub_date в ключе: SQLite может выдать id удалённого поста новому.
+        return (f'post_card:{post.id}:{post.pub_date.timestamp()}:'
+                f'{post.version}:{related}:{self.template}:{variant}')
+
+    def render(self, post):
+        return render_to_string(self.template, {'post': post, **self.context})
+
+    def __iter__(self):
+        posts = {self.key(post): post for post in self.page_obj}
+        cards = cache.get_many(posts)
+        missing = {
+            key: self.render(post)
+            for key, post in posts.items()
+            if key not in cards
+        }
+        if cards:
+            FEED_CACHE.inc(len(cards), cache='post_card', result='hit')
+        if missing:
+            FEED_CACHE.inc(len(missing), cache='post_card', result='miss')
+            cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+            cards.update(missing)
+        return (mark_safe(cards[key]) for key in posts)
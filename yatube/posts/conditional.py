@@ -0,0 +1,173 @@
+"""Условные GET-запросы (ETag и Last-Modified) для лент и страницы поста.
+
+Время изменения страницы - максимум LastModified по областям, от которых
+она зависит; это один запрос по уникальному индексу (scope, obj_id).
+ETag зависит ещё от читателя и параметров запроса (страница, курсор):
+одна и та же лента на разных страницах и у разных читателей выглядит
+по-разному. Last-Modified отдаётся только анонимным читателям: клиент,
+который пришлёт лишь If-Modified-Since, не должен получить 304 на
+страницу, отрендеренную для другого пользователя.
+
+У лент время изменения не раньше начала окна caching.counts_window:
+комментарии не отмечают изменение лент, и число комментариев в них
+обновляется со сменой окна.
+
+Анонимным читателям страницы отдаются целиком из кэша, без view
+и шаблонов: у них нет шапки с именем, переключателя лент и формы
+комментария. Ключ включает время изменения, поэтому сигналы Post,
+Comment и Follow, обновляющие LastModified, сбрасывают и этот кэш.
+Вошедшие читатели получают страницу, отрендеренную заново (с кэшем
+фрагментов лент). SessionMiddleware добавляет к ответу Vary: Cookie,
+потому что проверка пользователя читает сессию.
+"""
+import asyncio
+import hashlib
+from calendar import timegm
+from datetime import datetime, timezone
+from functools import reduce, wraps
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from core.db import run_sync
+
+from . import caching
+from .metrics import FEED_CACHE
+from .models import Group, LastModified, Post
+
+User = get_user_model()
+
+
+def scope(name, obj_id=0):
+    return Q(scope=name, obj_id=obj_id)
+
+
+def index_scopes(request):
+    return [scope('global')]
+
+
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values('id')[:1]
+    return [scope('group', group_id)]
+
+
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values('id')[:1]
+    scopes = [scope('author', author_id)]
+    if request.user.is_authenticated:
+        # Кнопка «Подписаться» зависит от подписок читателя.
+        scopes.append(scope('follow', request.user.pk))
+    return scopes
+
+
+def post_scopes(request, post_id):
+    # Число постов автора на странице меняется вместе с областью автора.
+    author_id = Post.objects.filter(pk=post_id).values('author_id')[:1]
+    return [scope('post', post_id), scope('author', author_id)]
+
+
+def last_modified(request, scopes):
+    """Время изменения страницы; считается один раз на запрос."""
+    if not hasattr(request, '_last_modified'):
+        request._last_modified = LastModified.objects.filter(
+            reduce(or_, scopes)
+        ).aggregate(modified=Max('modified'))['modified']
+    return request._last_modified
+
+
+def page_key(request, modified):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    stamp = modified.timestamp() if modified else 0
+    return f'anonymous_page:{path}:{stamp}'
+
+
+def page_etag(request, modified):
+    if modified is None:
+        return None
+    validator = (f'{modified.isoformat()}|{request.user.pk}|'
+                 f'{request.GET.urlencode()}')
+    if request.user.is_authenticated:
+        # В странице форма с CSRF-токеном, а вход меняет и ключ сессии,
+        # и секрет CSRF: копия из прошлой сессии не годится.
+        session = getattr(request, 'session', None)
+        validator += f'|{session and session.session_key}'
+    return quote_etag(hashlib.md5(validator.encode()).hexdigest())
+
+
+def add_validators(request, response, etag, header_modified):
+    if request.method in ('GET', 'HEAD'):
+        if header_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(header_modified)
+        if etag:
+            response.headers.setdefault('ETag', etag)
+    return response
+
+
+def before_view(get_scopes, feed, request, args, kwargs):
+    """Ответ без вызова view (304 или страница из кэша) или None,
+    ключ кэша страницы и валидаторы (etag, last_modified)."""
+    modified = last_modified(request, get_scopes(request, *args, **kwargs))
+    if feed:
+        window = datetime.fromtimestamp(
+            caching.counts_window(), timezone.utc)
+        modified = max(modified, window) if modified else window
+    etag = page_etag(request, modified)
+    # Как в django.views.decorators.http.condition.
+    header_modified = None
+    if modified and not request.user.is_authenticated:
+        header_modified = timegm(modified.utctimetuple())
+    validators = (etag, header_modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=header_modified)
+    if (response is not None or request.user.is_authenticated
+            or request.method not in ('GET', 'HEAD')):
+        return response, None, validators
+    key = page_key(request, modified)
+    response = cache.get(key)
+    FEED_CACHE.inc(cache='page', result='miss' if response is None else 'hit')
+    return response, key, validators
+
+
+def store(key, response):
+    # Ответ с cookie нельзя отдавать другим читателям.
+    if key and response.status_code == 200 and not response.cookies:
+        cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+
+
+def conditional_page(get_scopes, feed=False):
+    """Декоратор view (обычного или async): отвечает 304, если страница
+    не менялась, а анонимным читателям отдаёт её из кэша.
+    get_scopes(request, **kwargs) - список Q по LastModified; feed -
+    на странице лента с числом комментариев в карточках."""
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                response, key, validators = await run_sync(
+                    before_view, get_scopes, feed, request, args, kwargs)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if key:
+                        await run_sync(store, key, response)
+                return add_validators(request, response, *validators)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response, key, validators = before_view(
+                get_scopes, feed, request, args, kwargs)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                store(key, response)
+            return add_validators(request, response, *validators)
+
+        return wrapper
+
+    return decorator
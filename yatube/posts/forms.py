@@ -3,10 +3,22 @@ from django import forms
 from .models import Comment, Post
 
 
+class PostImageField(forms.ImageField):
+    """ImageField, который показывает причину, по которой
+    PostImageUploadHandler отклонил файл."""
+
+    def to_python(self, data):
+        upload_error = getattr(data, 'upload_error', None)
+        if upload_error:
+            raise forms.ValidationError(upload_error, code='upload_error')
+        return super().to_python(data)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {'image': PostImageField}
 
 
 class CommentForm(forms.ModelForm):
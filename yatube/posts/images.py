@@ -0,0 +1,162 @@
+"""Фоновая генерация миниатюр и вариантов картинок постов.
+
+После сохранения поста пул потоков кадрирует картинку, создаёт миниатюру
+и набор вариантов разной ширины и формата (для srcset) и записывает их
+в Post.thumbnail и Post.image_variants. Шаблоны выводят готовые URL
+и не обращаются к Pillow во время рендера.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from . import caching
+from .metrics import IMAGE_SECONDS
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'jpeg': 'jpg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_IMAGE_WORKERS,
+                thread_name_prefix='post-images',
+            )
+        return _executor
+
+
+def supported_formats(formats):
+    """Форматы из списка, которые умеет сохранять установленный Pillow."""
+    Image.init()
+    return [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+
+
+def _encode(image, fmt, quality):
+    buffer = BytesIO()
+    image.save(buffer, fmt.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+def render_images(source, size, widths, formats, quality):
+    """Кадрирует картинку до size и кодирует миниатюру и варианты.
+
+    Не зависит от Django, поэтому может выполняться в другом процессе.
+    Возвращает (миниатюра в JPEG, [(формат, ширина, байты), ...]).
+    """
+    width, height = size
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        cropped = ImageOps.fit(image.convert('RGB'), size, Image.LANCZOS)
+    thumbnail = _encode(cropped, 'jpeg', quality)
+    variants = []
+    for variant_width in widths:
+        if variant_width == width:
+            resized = cropped
+        else:
+            resized = cropped.resize(
+                (variant_width, round(height * variant_width / width)),
+                Image.LANCZOS,
+            )
+        for fmt in formats:
+            variants.append(
+                (fmt, variant_width, _encode(resized, fmt, quality)))
+    return thumbnail, variants
+
+
+def render_settings():
+    """Аргументы render_images из настроек проекта."""
+    return {
+        'size': tuple(settings.POST_THUMBNAIL_SIZE),
+        'widths': tuple(settings.POST_IMAGE_WIDTHS),
+        'formats': supported_formats(settings.POST_IMAGE_FORMATS),
+        'quality': settings.POST_THUMBNAIL_QUALITY,
+    }
+
+
+def store_images(post, thumbnail, variants):
+    """Сохраняет результат render_images в хранилище и в пост."""
+    storage = post.image.storage
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    width, height = settings.POST_THUMBNAIL_SIZE
+    post.thumbnail.save(
+        f'{stem}_{width}x{height}.jpg', ContentFile(thumbnail), save=False)
+    files = {}
+    for fmt, variant_width, content in variants:
+        name = storage.save(
+            f'posts/variants/{stem}_{variant_width}.'
+            f'{EXTENSIONS.get(fmt, fmt)}',
+            ContentFile(content),
+        )
+        files.setdefault(fmt, []).append([variant_width, name])
+    image_variants = [
+        {'type': f'image/{fmt}', 'files': fmt_files}
+        for fmt, fmt_files in files.items()
+    ]
+    # Картинку могли заменить, пока шла обработка.
+    updated = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnail=post.thumbnail.name,
+        image_variants=image_variants,
+        version=F('version') + 1,
+    )
+    if updated:
+        caching.bump_post_feeds(
+            post.author_id, post.group_id, post_id=post.pk)
+        return True
+    post.thumbnail.delete(save=False)
+    for fmt_files in files.values():
+        for _, name in fmt_files:
+            storage.delete(name)
+    return False
+
+
+def generate_images(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'author_id', 'group_id').first()
+    if post is None or not post.image:
+        return
+    start = time.perf_counter()
+    with post.image.open('rb') as source:
+        thumbnail, variants = render_images(source, **render_settings())
+    IMAGE_SECONDS.observe(time.perf_counter() - start)
+    store_images(post, thumbnail, variants)
+
+
+def _run(post_id):
+    try:
+        generate_images(post_id)
+    except Exception:
+        logger.exception('Не удалось обработать картинку поста %s', post_id)
+    finally:
+        # Соединение с БД у каждого потока пула своё.
+        connection.close()
+
+
+def schedule_images(post):
+    """Ставит обработку картинки в очередь после коммита транзакции."""
+    if not post.image:
+        return
+    post_id = post.pk
+
+    def submit():
+        if settings.POST_IMAGE_WORKERS:
+            get_executor().submit(_run, post_id)
+        else:
+            generate_images(post_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory, override_settings
+
+from posts import benchmarks
+from posts.models import Follow, Post
+
+SERVERS = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность лент под WSGI (синхронные '
+            'view, пул потоков) и ASGI (async view) при большом числе '
+            'одновременных клиентов. Каждый сервер запускается в отдельном '
+            'процессе: выбор view зависит от YATUBE_ASYNC_VIEWS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Одновременных клиентов.')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=16,
+                            help='Потоков WSGI-сервера и пула ASGI.')
+        parser.add_argument(
+            '--db-latency', type=float, default=2,
+            help='Задержка каждого запроса к БД, мс: SQLite в процессе '
+                 'отвечает быстрее сетевой базы.')
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--server', choices=SERVERS,
+                            help='Прогон одного сервера в этом процессе.')
+
+    def handle(self, *args, **options):
+        if options['server']:
+            result = self.run_server(options)
+            self.stdout.write(json.dumps(result))
+            return
+        self.stdout.write(
+            f'Клиентов: {options["concurrency"]}, запросов: '
+            f'{options["requests"]}, потоков: {options["threads"]}, '
+            f'задержка БД: {options["db_latency"]} мс')
+        results = {}
+        for server in SERVERS:
+            results[server] = result = self.spawn(server, options)
+            self.stdout.write(
+                f'{server.upper()}: {result["rps"]:.0f} запросов/с, '
+                f'p50 {result["p50"]:.1f} ms, p95 {result["p95"]:.1f} ms, '
+                f'ошибок {result["errors"]}')
+        gain = results['asgi']['rps'] / results['wsgi']['rps']
+        self.stdout.write(self.style.SUCCESS(
+            f'ASGI / WSGI: x{gain:.2f}'))
+
+    def spawn(self, server, options):
+        env = dict(os.environ)
+        env.pop('YATUBE_ASYNC_VIEWS', None)
+        if server == 'asgi':
+            env['YATUBE_ASYNC_VIEWS'] = '1'
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+            'bench_asgi', '--server', server,
+        ]
+        for name in ('concurrency', 'requests', 'threads', 'db_latency',
+                     'posts'):
+            command += [f'--{name.replace("_", "-")}', str(options[name])]
+        output = subprocess.run(
+            command, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def run_server(self, options):
+        latency = options['db_latency'] / 1000
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # Объект соединения потока переживает переподключения.
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['*']), \
+                benchmarks.isolated_database(
+                    name=os.path.join(directory, 'bench.sqlite3')):
+            requests = self.prepare(options)
+            connection.close()
+            if latency:
+                connection_created.connect(add_latency)
+            try:
+                run = self.run_asgi if settings.ASYNC_VIEWS else self.run_wsgi
+                elapsed, timings, errors = run(requests, options)
+            finally:
+                connection_created.disconnect(add_latency)
+        stats = benchmarks.summary(timings)
+        return {
+            'rps': len(timings) / elapsed,
+            'p50': stats['p50'],
+            'p95': stats['p95'],
+            'errors': errors,
+        }
+
+    def prepare(self, options):
+        """Данные и список (путь, cookie) для клиентов."""
+        authors, groups = benchmarks.seed(
+            posts=options['posts'], authors=20, groups=5)
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in authors for author in authors[:5] if user != author
+        )
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:50])
+        cookies = []
+        for user in authors:
+            client = Client()
+            client.force_login(user)
+            cookies.append(f'sessionid={client.cookies["sessionid"].value}')
+        paths = [
+            '/',
+            f'/group/{groups[0].slug}/',
+            f'/profile/{authors[0].username}/',
+            f'/posts/{post_ids[0]}/',
+            '/follow/',
+        ]
+        requests = []
+        for number in range(options['requests']):
+            path = paths[number % len(paths)]
+            if path.startswith('/posts/'):
+                path = f'/posts/{post_ids[number % len(post_ids)]}/'
+            requests.append((path, cookies[number % len(cookies)]))
+        return requests
+
+    def run_wsgi(self, requests, options):
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        server = ThreadPoolExecutor(options['threads'])
+        timings, errors = [], []
+
+        def call(path, cookie):
+            environ = factory._base_environ(
+                PATH_INFO=path, REQUEST_METHOD='GET', HTTP_COOKIE=cookie)
+            statuses = []
+            body = handler(
+                environ, lambda status, headers: statuses.append(status))
+            b''.join(body)
+            body.close()
+            return statuses[0]
+
+        def client(number):
+            for path, cookie in requests[number::options['concurrency']]:
+                start = time.perf_counter()
+                status = server.submit(call, path, cookie).result()
+                timings.append(time.perf_counter() - start)
+                if not status.startswith('200'):
+                    errors.append(status)
+
+        clients = [
+            threading.Thread(target=client, args=(number,))
+            for number in range(options['concurrency'])
+        ]
+        start = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        return elapsed, timings, len(errors)
+
+    def run_asgi(self, requests, options):
+        timings, errors = [], []
+
+        async def call(application, path, cookie):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'},
+                'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'root_path': '', 'client': ('127.0.0.1', 50000),
+                'server': ('testserver', 80),
+                'headers': [(b'host', b'testserver'),
+                            (b'cookie', cookie.encode())],
+            }
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                messages.append(message)
+
+            await application(scope, receive, send)
+            return messages[0]['status']
+
+        async def client(application, number):
+            for path, cookie in requests[number::options['concurrency']]:
+                start = time.perf_counter()
+                status = await call(application, path, cookie)
+                timings.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(status)
+
+        async def main():
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(options['threads']))
+            from yatube.asgi import application
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                client(application, number)
+                for number in range(options['concurrency'])))
+            return time.perf_counter() - start
+
+        elapsed = asyncio.run(main())
+        return elapsed, timings, len(errors)
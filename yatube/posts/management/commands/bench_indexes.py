@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import benchmarks
+from posts.models import Comment, Follow, Post
+from yatube.settings import COUNT_POST_FOR_PAGE
+
+FEED_INDEXES = (
+    (Post, 'post_date_idx'),
+    (Post, 'post_group_date_idx'),
+    (Post, 'post_author_date_idx'),
+    (Comment, 'comment_post_created_idx'),
+)
+
+
+def get_index(model, name):
+    return next(
+        index for index in model._meta.indexes if index.name == name)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает планы и время запросов лент с составными '
+            'индексами и без них.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--comments', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with benchmarks.isolated_database():
+            self.stdout.write(f'Заполняю базу: {options["posts"]} постов')
+            users, groups = benchmarks.seed(posts=options['posts'])
+            reader = users[0]
+            Follow.objects.bulk_create(
+                Follow(user=reader, author=author) for author in users[1:6])
+            post = Post.objects.order_by('-pub_date', '-id').first()
+            Comment.objects.bulk_create(
+                (Comment(post_id=post.pk - i % 100, author=reader,
+                         text=f'Комментарий {i}')
+                 for i in range(options['comments'])),
+                batch_size=5000,
+            )
+            page = slice(0, COUNT_POST_FOR_PAGE)
+            queries = {
+                'index': Post.objects.for_feed()[page],
+                'group_posts': Post.objects.for_feed().filter(
+                    group=groups[0])[page],
+                'profile': Post.objects.for_feed().filter(
+                    author=users[1])[page],
+                'follow_index': Post.objects.for_feed().filter(
+                    author__following__user=reader)[page],
+                'post_detail': Comment.objects.filter(
+                    post_id=post.pk).order_by('created', 'id'),
+            }
+
+            self.drop_indexes()
+            without = self.run(queries, options['repeat'])
+            self.create_indexes()
+            with_indexes = self.run(queries, options['repeat'])
+
+        for view, (plan, timings) in without.items():
+            new_plan, new_timings = with_indexes[view]
+            before = benchmarks.summary(timings)['p50']
+            after = benchmarks.summary(new_timings)['p50']
+            self.stdout.write(self.style.MIGRATE_HEADING(view))
+            self.stdout.write(f'  без индексов:\n{self.indent(plan)}')
+            self.stdout.write(f'  с индексами:\n{self.indent(new_plan)}')
+            self.stdout.write(self.style.SUCCESS(
+                f'  p50: {before:.2f} ms -> {after:.2f} ms'))
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, name in FEED_INDEXES:
+                editor.remove_index(model, get_index(model, name))
+
+    def create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, name in FEED_INDEXES:
+                editor.add_index(model, get_index(model, name))
+
+    @staticmethod
+    def run(queries, repeat):
+        results = {}
+        for view, queryset in queries.items():
+            # Каждый замер - новый запрос к базе, без кэша QuerySet.
+            timings = benchmarks.measure(
+                lambda: list(queryset.all()), repeat)
+            results[view] = (queryset.explain(), timings)
+        return results
+
+    @staticmethod
+    def indent(plan):
+        return '\n'.join(f'    {line}' for line in plan.splitlines())
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from posts import benchmarks
+from posts.caching import PostCards
+from posts.models import Post
+from yatube.settings import COUNT_POST_FOR_PAGE
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время сборки страницы ленты: рендер каждой карточки '
+            'против карточек из кэша фрагментов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with benchmarks.isolated_database():
+            benchmarks.seed(posts=options['posts'])
+            page = list(Post.objects.for_feed()[:COUNT_POST_FOR_PAGE])
+
+            def render_all():
+                for post in page:
+                    render_to_string(
+                        'posts/includes/content.html',
+                        {'post': post, 'show_group_link': True})
+
+            def assemble():
+                list(PostCards(page, show_group_link=True))
+
+            def assemble_cold():
+                cache.clear()
+                assemble()
+
+            repeat = options['repeat']
+            rendered = benchmarks.measure(render_all, repeat)
+            cold = benchmarks.measure(assemble_cold, repeat)
+            assemble()
+            warm = benchmarks.measure(assemble, repeat)
+
+        self.stdout.write(f'Постов на странице: {len(page)}')
+        self.stdout.write(benchmarks.format_summary('рендер', rendered))
+        self.stdout.write(benchmarks.format_summary('кэш, холодный', cold))
+        self.stdout.write(benchmarks.format_summary('кэш, тёплый', warm))
+        saved = (benchmarks.summary(rendered)['mean']
+                 - benchmarks.summary(warm)['mean'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Экономия на странице: {saved:.2f} ms'))
@@ -0,0 +1,71 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import benchmarks
+from posts.models import Post
+from posts.paginator import CursorPaginator
+from posts.search import BACKENDS, LikeSearch
+from yatube.settings import COUNT_POST_FOR_PAGE
+
+# Частые слова встречаются почти в каждом посте
+COMMON_WORDS = ['пост', 'сегодня', 'новости', 'город', 'погода', 'время']
+# Редкое слово - в одном посте из RARE_EVERY
+RARE_WORD = 'редкость'
+RARE_EVERY = 10_000
+# Слово, которого нет ни в одном посте
+MISSING_WORD = 'отсутствует'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск по полнотекстовому индексу с перебором '
+            "LIKE '%...%' на первой странице выдачи.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--words', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        backend = BACKENDS.get(connection.vendor, LikeSearch)()
+        vocabulary = COMMON_WORDS + [
+            f'слово{i}' for i in range(options['posts'] // 10)]
+        randomizer = random.Random(1)
+        with benchmarks.isolated_database():
+            users, _ = benchmarks.seed(posts=0)
+            batch = []
+            for i in range(options['posts']):
+                words = [
+                    randomizer.choice(vocabulary)
+                    for _ in range(options['words'])
+                ]
+                if i % RARE_EVERY == 0:
+                    words.append(RARE_WORD)
+                batch.append(Post(
+                    author=users[i % len(users)], text=' '.join(words)))
+                if len(batch) >= 5000:
+                    Post.objects.bulk_create(batch)
+                    batch = []
+            Post.objects.bulk_create(batch)
+
+            for query in ('пост', 'город погода', RARE_WORD,
+                          f'пост {RARE_WORD}', MISSING_WORD):
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'Запрос «{query}»'))
+                for name, search in (('LIKE', LikeSearch()),
+                                     (connection.vendor, backend)):
+                    timings = benchmarks.measure(
+                        lambda: self.first_page(search, query),
+                        options['repeat'])
+                    self.stdout.write('  ' + benchmarks.format_summary(
+                        name, timings))
+
+    @staticmethod
+    def first_page(search, query):
+        paginator = CursorPaginator(
+            search.search(Post.objects.for_feed(), query),
+            COUNT_POST_FOR_PAGE,
+            ordering=search.ordering,
+        )
+        return list(paginator.get_page())
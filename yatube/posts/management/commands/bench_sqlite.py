@@ -0,0 +1,110 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.db import PROFILES
+from posts import benchmarks
+from posts.models import Post
+
+PROFILE_NAMES = {'': 'по умолчанию', 'production': 'production'}
+
+
+class Command(BaseCommand):
+    help = ('Нагружает SQLite параллельными чтениями ленты и записью '
+            'комментариев и сравнивает профили базы из core/db.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на поток.')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Доля запросов add_comment.')
+        parser.add_argument('--posts', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Потоков: {options["threads"]}, запросов на поток: '
+            f'{options["requests"]}, доля записи: {options["write_ratio"]}')
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key)
+                 for key in ('CONN_MAX_AGE', 'OPTIONS', 'PRAGMAS')}
+        throughput = {}
+        try:
+            for profile, config in PROFILES.items():
+                # Все потоки создают соединения по этому же словарю.
+                settings_dict['CONN_MAX_AGE'] = config['CONN_MAX_AGE']
+                settings_dict['OPTIONS'] = dict(config.get('OPTIONS', {}))
+                settings_dict['PRAGMAS'] = dict(config['PRAGMAS'])
+                throughput[profile] = self.run_profile(
+                    PROFILE_NAMES.get(profile, profile), options)
+        finally:
+            settings_dict.update(saved)
+        gain = throughput['production'] / throughput['']
+        self.stdout.write(self.style.SUCCESS(
+            f'Пропускная способность production: x{gain:.2f}'))
+
+    def run_profile(self, name, options):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(DEBUG=False, ALLOWED_HOSTS=['*']), \
+                benchmarks.isolated_database(
+                    name=os.path.join(directory, 'bench.sqlite3')):
+            benchmarks.seed(posts=options['posts'], authors=20, groups=5)
+            post_ids = list(Post.objects.values_list('pk', flat=True))
+            clients = []
+            for user in benchmarks.User.objects.all()[:options['threads']]:
+                client = Client()
+                client.force_login(user)
+                clients.append(client)
+            connection.close()
+            reads, writes, errors = [], [], []
+            barrier = threading.Barrier(len(clients) + 1)
+
+            def worker(number, client):
+                generator = random.Random(number)
+                barrier.wait()
+                try:
+                    for _ in range(options['requests']):
+                        write = generator.random() < options['write_ratio']
+                        start = time.perf_counter()
+                        try:
+                            if write:
+                                client.post(reverse(
+                                    'posts:add_comment',
+                                    args=(generator.choice(post_ids),)
+                                ), {'text': 'Комментарий'})
+                            else:
+                                client.get(reverse('posts:index'))
+                        except OperationalError as error:
+                            errors.append(error)
+                            continue
+                        elapsed = time.perf_counter() - start
+                        (writes if write else reads).append(elapsed)
+                finally:
+                    connection.close()
+
+            threads = [
+                threading.Thread(target=worker, args=(number, client))
+                for number, client in enumerate(clients)
+            ]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            start = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        done = len(reads) + len(writes)
+        self.stdout.write(
+            f'Профиль {name}: {done / elapsed:.0f} запросов/с, '
+            f'ошибок {len(errors)}')
+        self.stdout.write('  ' + benchmarks.format_summary('index', reads))
+        self.stdout.write(
+            '  ' + benchmarks.format_summary('add_comment', writes))
+        return done / elapsed
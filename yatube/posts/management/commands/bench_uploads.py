@@ -0,0 +1,94 @@
+import os
+import threading
+import tracemalloc
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import load_handler
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+from PIL import Image
+
+from posts import benchmarks
+from posts.forms import PostForm
+
+HANDLERS = {
+    'Django по умолчанию': [
+        'django.core.files.uploadhandler.MemoryFileUploadHandler',
+        'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+    ],
+    'потоковый': ['posts.uploadhandlers.PostImageUploadHandler'],
+}
+
+
+def make_image(megapixels):
+    """JPEG из шума: плохо сжимается, поэтому файл получается крупным."""
+    side = int((megapixels * 1_000_000) ** 0.5)
+    image = Image.frombytes('RGB', (side, side), os.urandom(side * side * 3))
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = ('Параллельно загружает крупные картинки и сравнивает пик '
+            'памяти Python при стандартных и потоковых обработчиках.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=32)
+        parser.add_argument('--megapixels', type=float, default=0.7)
+
+    def handle(self, *args, **options):
+        content = make_image(options['megapixels'])
+        self.stdout.write(
+            f'Загрузок: {options["uploads"]}, '
+            f'размер файла: {len(content) / 1024 / 1024:.1f} МБ')
+        factory = RequestFactory()
+        peaks = {}
+        with benchmarks.isolated_database():
+            for mode, handlers in HANDLERS.items():
+                requests = [
+                    factory.post(reverse('posts:post_create'), {
+                        'text': 'Пост',
+                        'image': SimpleUploadedFile(
+                            'big.jpg', content, 'image/jpeg'),
+                    })
+                    for _ in range(options['uploads'])
+                ]
+                for request in requests:
+                    request.upload_handlers = [
+                        load_handler(handler, request)
+                        for handler in handlers
+                    ]
+                peaks[mode] = self.measure(requests)
+                self.stdout.write(
+                    f'{mode}: пик {peaks[mode] / 1024 / 1024:.1f} МБ')
+        saved = peaks['Django по умолчанию'] - peaks['потоковый']
+        self.stdout.write(self.style.SUCCESS(
+            f'Экономия памяти: {saved / 1024 / 1024:.1f} МБ'))
+
+    def measure(self, requests):
+        barrier = threading.Barrier(len(requests))
+
+        def upload(request):
+            barrier.wait()
+            form = PostForm(request.POST, request.FILES)
+            form.is_valid()
+            # Держим файл открытым до конца, как view до сохранения поста.
+            barrier.wait()
+            for uploaded in request.FILES.values():
+                uploaded.close()
+
+        tracemalloc.start()
+        threads = [
+            threading.Thread(target=upload, args=(request,))
+            for request in requests
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
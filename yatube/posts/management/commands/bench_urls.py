@@ -0,0 +1,291 @@
+import http.client
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts import benchmarks
+from posts.models import Comment, Follow, Post
+
+
+class ClientDriver:
+    """Запросы через тестовый клиент Django в том же потоке."""
+
+    def __init__(self, user, templates):
+        self.client = Client()
+        self.client.force_login(user)
+        self.templates = templates
+
+    def request(self, method, url, data=None):
+        call = getattr(self.client, method.lower())
+        response, elapsed, queries, render = benchmarks.profile_call(
+            lambda: call(url, data or {}), self.templates)
+        return response.status_code, elapsed, queries, render
+
+    def close(self):
+        pass
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WsgiDriver:
+    """Настоящие HTTP-запросы к WSGI-серверу в отдельном потоке.
+    Запросы к БД и рендер считаются в потоке сервера."""
+
+    def __init__(self, user, templates):
+        self.templates = templates
+        self.last = None
+        handler = WSGIHandler()
+
+        def app(environ, start_response):
+            body, _, queries, render = benchmarks.profile_call(
+                lambda: b''.join(handler(environ, start_response)),
+                self.templates)
+            self.last = queries, render
+            return [body]
+
+        self.server = make_server(
+            '127.0.0.1', 0, app, handler_class=QuietHandler)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        client = Client()
+        client.force_login(user)
+        csrf_request = HttpRequest()
+        self.csrf_token = get_token(csrf_request)
+        self.cookies = '; '.join([
+            f'{client.cookies[name].key}={client.cookies[name].value}'
+            for name in client.cookies
+        ] + [f'csrftoken={csrf_request.META["CSRF_COOKIE"]}'])
+
+    def request(self, method, url, data=None):
+        headers = {'Cookie': self.cookies, 'Host': 'localhost'}
+        body = None
+        if method == 'POST':
+            body = urlencode(data or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token
+        connection = http.client.HTTPConnection(
+            *self.server.server_address)
+        start = time.perf_counter()
+        connection.request(method, url, body, headers)
+        response = connection.getresponse()
+        response.read()
+        elapsed = time.perf_counter() - start
+        connection.close()
+        queries, render = self.last
+        return response.status, elapsed, queries, render
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+DRIVERS = {'client': ClientDriver, 'wsgi': WsgiDriver}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон страниц posts: задержка p50/p95/p99, '
+            'запросы к БД, время рендера и память на каждый URL. '
+            'Результат пишется в JSON и сравнивается с прошлым прогоном.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--authors', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--comments', type=int, default=200)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Сколько первых запросов к каждому URL не учитывать.')
+        parser.add_argument(
+            '--driver', choices=DRIVERS, default='client',
+            help='client - тестовый клиент, wsgi - HTTP к серверу в процессе.')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument(
+            '--output', help='Куда записать результаты (JSON).')
+        parser.add_argument(
+            '--baseline', help='Результаты прошлого прогона для сравнения.')
+        parser.add_argument(
+            '--max-regression', type=float, default=0.25,
+            help='Допустимый рост p95 и памяти относительно baseline, доля.')
+
+    def handle(self, *args, **options):
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['*']), \
+                benchmarks.isolated_database():
+            scenarios, reader = self.seed(options)
+            with benchmarks.timed_templates() as templates:
+                driver = DRIVERS[options['driver']](reader, templates)
+                try:
+                    urls = {
+                        name: self.run(driver, method, url, data, options)
+                        for name, method, url, data in scenarios
+                    }
+                finally:
+                    driver.close()
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'driver': options['driver'],
+                'cold': options['cold'],
+                'data': {
+                    key: options[key] for key in (
+                        'posts', 'authors', 'groups', 'comments', 'follows')
+                },
+                'repeat': options['repeat'],
+                'warmup': options['warmup'],
+            },
+            'urls': urls,
+        }
+        for name, metrics in urls.items():
+            self.stdout.write(
+                f'{name:13} p50 {metrics["p50_ms"]:8.2f} ms  '
+                f'p95 {metrics["p95_ms"]:8.2f} ms  '
+                f'p99 {metrics["p99_ms"]:8.2f} ms  '
+                f'запросов {metrics["queries"]:3}  '
+                f'шаблоны {metrics["template_ms"]:7.2f} ms  '
+                f'память {metrics["memory_kb"]:8.1f} КБ')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            for key in ('driver', 'cold', 'data'):
+                if baseline['meta'].get(key) != results['meta'][key]:
+                    self.stderr.write(
+                        f'Внимание: {key} отличается от baseline, '
+                        'сравнение неточное.')
+            regressions = self.compare(
+                urls, baseline['urls'], options['max_regression'])
+            if regressions:
+                raise CommandError('Производительность ухудшилась:\n'
+                                   + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS(
+                f'Без ухудшений относительно {baseline["meta"]["revision"]}'))
+
+    def seed(self, options):
+        users, groups = benchmarks.seed(
+            posts=options['posts'], authors=options['authors'],
+            groups=options['groups'])
+        reader = users[0]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author)
+            for author in users[1:options['follows'] + 1])
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=users[i % len(users)],
+                    text=f'Комментарий {i}')
+            for i in range(options['comments']))
+        Post.refresh_comment_stats([post.id])
+        scenarios = [
+            ('index', 'GET', reverse('posts:index'), None),
+            ('group_posts', 'GET', reverse(
+                'posts:group_posts', kwargs={'slug': groups[0].slug}), None),
+            ('profile', 'GET', reverse(
+                'posts:profile', kwargs={'username': users[1].username}),
+             None),
+            ('post_detail', 'GET', reverse(
+                'posts:post_detail', kwargs={'post_id': post.id}), None),
+            ('follow_index', 'GET', reverse('posts:follow_index'), None),
+            ('post_create', 'POST', reverse('posts:post_create'),
+             {'text': 'Пост из бенчмарка'}),
+            ('add_comment', 'POST', reverse(
+                'posts:add_comment', kwargs={'post_id': post.id}),
+             {'text': 'Комментарий из бенчмарка'}),
+        ]
+        return scenarios, reader
+
+    def run(self, driver, method, url, data, options):
+        for _ in range(options['warmup']):
+            driver.request(method, url, data)
+        timings, queries, renders = [], [], []
+        for _ in range(options['repeat']):
+            if options['cold']:
+                cache.clear()
+            status, elapsed, query_count, render = driver.request(
+                method, url, data)
+            if status >= 400:
+                raise CommandError(f'{method} {url}: ответ {status}')
+            timings.append(elapsed)
+            queries.append(query_count)
+            renders.append(render)
+
+        # Память - отдельным проходом: tracemalloc замедляет запросы.
+        tracemalloc.start()
+        peaks = []
+        for _ in range(min(options['repeat'], 5)):
+            if options['cold']:
+                cache.clear()
+            tracemalloc.reset_peak()
+            start, _ = tracemalloc.get_traced_memory()
+            driver.request(method, url, data)
+            peaks.append(tracemalloc.get_traced_memory()[1] - start)
+        tracemalloc.stop()
+
+        stats = benchmarks.summary(timings)
+        return {
+            'method': method,
+            'url': url,
+            'mean_ms': stats['mean'],
+            'p50_ms': stats['p50'],
+            'p95_ms': stats['p95'],
+            'p99_ms': stats['p99'],
+            'queries': max(queries),
+            'template_ms': statistics.mean(renders) * 1000,
+            'memory_kb': max(peaks) / 1024,
+        }
+
+    @staticmethod
+    def compare(urls, baseline, max_regression):
+        regressions = []
+        for name, metrics in urls.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if metrics['queries'] > base['queries']:
+                regressions.append(
+                    f'{name}: запросов {base["queries"]} -> '
+                    f'{metrics["queries"]}')
+            for key in ('p95_ms', 'memory_kb'):
+                limit = base[key] * (1 + max_regression)
+                if metrics[key] > limit:
+                    regressions.append(
+                        f'{name}: {key} {base[key]:.2f} -> '
+                        f'{metrics[key]:.2f} (порог {limit:.2f})')
+        return regressions
@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, specs, write_rows
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и подписки '
+            'в каталог: по файлу NDJSON или CSV на модель.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Каталог для файлов выгрузки.')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson')
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=[name for name, _, _ in specs()],
+            help='Какие модели выгрузить (по умолчанию - все).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['path'], exist_ok=True)
+        fmt = options['format']
+        for name, model, fields in specs():
+            if options['models'] and name not in options['models']:
+                continue
+            rows = model.objects.order_by('pk').values_list(
+                *fields).iterator(chunk_size=options['batch_size'])
+            filename = os.path.join(options['path'], f'{name}.{fmt}')
+            start = time.perf_counter()
+            with open(filename, 'w', encoding='utf-8', newline='') as file:
+                count = write_rows(file, fmt, fields, rows)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'{name}: {count} строк за {elapsed:.1f} с '
+                f'({count / max(elapsed, 1e-6):.0f} строк/с)')
+        self.stdout.write(self.style.SUCCESS('Выгрузка завершена'))
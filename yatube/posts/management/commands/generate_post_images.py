@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.images import render_images, render_settings, store_images
+from posts.models import Post
+
+
+def _render(content, options):
+    return render_images(BytesIO(content), **options)
+
+
+class Command(BaseCommand):
+    help = ('Создаёт миниатюры и варианты картинок постов. Картинки '
+            'обрабатываются параллельно на всех ядрах процессора.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Обработать и посты, у которых варианты уже есть.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов (по умолчанию - число ядер).',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only(
+            'image', 'author_id', 'group_id')
+        if not options['all']:
+            posts = posts.filter(image_variants=[])
+        render_options = render_settings()
+        workers = max(options['workers'], 1)
+        # Дочерние процессы не должны наследовать открытые соединения.
+        connections.close_all()
+
+        count = 0
+        pending = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for post in posts.iterator():
+                with post.image.open('rb') as source:
+                    future = executor.submit(
+                        _render, source.read(), render_options)
+                pending[future] = post
+                # Не держим в памяти больше картинок, чем успевают обработать.
+                if len(pending) >= workers * 2:
+                    count += self._store(pending, FIRST_COMPLETED)
+            count += self._store(pending)
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {count}'))
+
+    def _store(self, pending, return_when='ALL_COMPLETED'):
+        done, _ = wait(pending, return_when=return_when)
+        stored = 0
+        for future in done:
+            post = pending.pop(future)
+            try:
+                thumbnail, variants = future.result()
+            except Exception as error:
+                self.stderr.write(f'Пост {post.pk}: {error}')
+                continue
+            stored += store_images(post, thumbnail, variants)
+        return stored
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from posts import caching
+from posts.timeline import get_timeline
+from posts.transfer import (FORMATS, build_object, keep_dates, read_rows,
+                            specs)
+
+PROGRESS_FILE = '.import-progress.json'
+
+
+class Command(BaseCommand):
+    help = ('Загружает в базу выгрузку export_data пачками bulk_create. '
+            'После сбоя загрузку можно продолжить с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Каталог с файлами выгрузки.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк записывать за один INSERT.',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Пропустить строки, загруженные до сбоя.',
+        )
+
+    def handle(self, *args, **options):
+        self.path = options['path']
+        self.verbosity = options['verbosity']
+        self.progress_file = os.path.join(self.path, PROGRESS_FILE)
+        self.progress = {}
+        if options['resume'] and os.path.exists(self.progress_file):
+            with open(self.progress_file, encoding='utf-8') as file:
+                self.progress = json.load(file)
+        imported = []
+        for name, model, fields in specs():
+            filename = self.find_file(name)
+            if filename is None:
+                continue
+            try:
+                self.import_file(name, model, fields, filename, options)
+            except Exception as error:
+                raise CommandError(
+                    f'{name}: {error}. Продолжить загрузку: '
+                    f'import_data {self.path} --resume') from error
+            imported.append((name, model))
+
+        if os.path.exists(self.progress_file):
+            os.remove(self.progress_file)
+        self.finish(dict(imported))
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
+
+    def find_file(self, name):
+        for fmt in FORMATS:
+            filename = os.path.join(self.path, f'{name}.{fmt}')
+            if os.path.exists(filename):
+                return filename
+        return None
+
+    def save_progress(self):
+        with open(self.progress_file, 'w', encoding='utf-8') as file:
+            json.dump(self.progress, file)
+
+    def import_file(self, name, model, fields, filename, options):
+        fmt = os.path.splitext(filename)[1][1:]
+        skip = self.progress.get(name, 0)
+        done = skip
+        start = time.perf_counter()
+        batch = []
+        with open(filename, encoding='utf-8', newline='') as file, \
+                keep_dates(model):
+            for number, record in enumerate(read_rows(file, fmt)):
+                if number < skip:
+                    continue
+                batch.append(build_object(model, fields, record))
+                if len(batch) >= options['batch_size']:
+                    done += self.save_batch(name, model, batch)
+                    batch = []
+            if batch:
+                done += self.save_batch(name, model, batch)
+        elapsed = time.perf_counter() - start
+        loaded = done - skip
+        self.stdout.write(
+            f'{name}: {loaded} строк за {elapsed:.1f} с '
+            f'({loaded / max(elapsed, 1e-6):.0f} строк/с)'
+            + (f', пропущено загруженных ранее: {skip}' if skip else ''))
+
+    def save_batch(self, name, model, batch):
+        with transaction.atomic():
+            # Строки с уже существующим ключом пропускаются: пачку,
+            # записанную перед самым сбоем, можно загрузить повторно.
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        self.progress[name] = self.progress.get(name, 0) + len(batch)
+        self.save_progress()
+        if self.verbosity > 1:
+            self.stdout.write(f'  {name}: {self.progress[name]}')
+        return len(batch)
+
+    def finish(self, imported):
+        """Повторяет то, что при обычном сохранении делают сигналы:
+        счётчики и ленты пересчитываются целиком, а кэш лент и страниц
+        сбрасывается разом, без обхода загруженных строк."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), list(imported.values()))
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        if 'posts' in imported:
+            call_command('rebuild_author_stats', stdout=self.stdout)
+        if 'comments' in imported:
+            call_command('rebuild_comment_stats', stdout=self.stdout)
+        if get_timeline() is not None and (
+                'posts' in imported or 'follows' in imported):
+            call_command('rebuild_timelines', stdout=self.stdout)
+        caching.bump_all()
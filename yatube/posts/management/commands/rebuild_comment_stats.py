@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from posts import caching
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики комментариев постов с таблицей комментариев '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10_000,
+            help='Сколько постов сверять за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = Post.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        fixed = 0
+        for start in range(0, last_id, batch_size):
+            fixed += self.reconcile(
+                Post.objects.filter(pk__gt=start, pk__lte=start + batch_size))
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {fixed}'))
+
+    def reconcile(self, posts):
+        same_last = Q(last_comment_at=F('actual_last_comment_at')) | Q(
+            last_comment_at__isnull=True,
+            actual_last_comment_at__isnull=True,
+        )
+        stale = list(posts.with_comment_stats().exclude(
+            Q(comment_count=F('actual_comment_count')) & same_last
+        ).values_list('author_id', 'group_id', 'pk'))
+        if not stale:
+            return 0
+        with transaction.atomic():
+            Post.refresh_comment_stats([pk for _, _, pk in stale])
+        scopes = {('global',)}
+        for author_id, group_id, post_id in stale:
+            scopes |= {('author', author_id), ('post', post_id)}
+            if group_id:
+                scopes.add(('group', group_id))
+        caching.bump(*scopes)
+        return len(stale)
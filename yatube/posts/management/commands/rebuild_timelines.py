@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.timeline import get_timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Заново собирает предвычисленные ленты подписок. Нужна после '
+            'включения FOLLOW_TIMELINE_BACKEND на существующих данных.')
+
+    def handle(self, *args, **options):
+        timeline = get_timeline()
+        if timeline is None:
+            raise CommandError('FOLLOW_TIMELINE_BACKEND не задан.')
+        users = User.objects.filter(
+            follower__isnull=False).distinct().values_list('id', flat=True)
+        count = 0
+        for user_id in users.iterator():
+            timeline.rebuild(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Собрано лент: {count}'))
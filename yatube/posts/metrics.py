@@ -0,0 +1,26 @@
+"""Метрики приложения posts; отдаются на /metrics (см. core/metrics.py)."""
+from core import metrics
+
+POSTS_CREATED = metrics.counter(
+    'yatube_posts_created_total',
+    'Созданные посты.',
+)
+COMMENTS_CREATED = metrics.counter(
+    'yatube_comments_created_total',
+    'Созданные комментарии.',
+)
+FEED_CACHE = metrics.counter(
+    'yatube_feed_cache_requests_total',
+    'Обращения к кэшу лент: фрагменты страниц и карточки постов.',
+    ('cache', 'result'),
+)
+IMAGE_SECONDS = metrics.histogram(
+    'yatube_post_image_seconds',
+    'Время генерации миниатюры и вариантов картинки поста.',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+WRITE_BATCH_SIZE = metrics.histogram(
+    'yatube_write_behind_batch_size',
+    'Записей в одной пачке отложенной записи (WRITE_BEHIND).',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
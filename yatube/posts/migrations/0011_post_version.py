@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_auto_20261017_0605'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Увеличивается при редактировании, входит в ключ кэша', verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, help_text='Генерируется в фоне после загрузки картинки', upload_to='posts/thumbs/', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='Файлы картинки разной ширины и формата для srcset', verbose_name='Варианты картинки'),
+        ),
+    ]
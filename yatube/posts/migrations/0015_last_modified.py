@@ -0,0 +1,26 @@
+# Generated by Django 3.2.3 on 2026-10-17 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastModified',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=16, verbose_name='Область')),
+                ('obj_id', models.PositiveIntegerField(default=0, verbose_name='Id объекта')),
+                ('modified', models.DateTimeField(verbose_name='Время изменения')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='lastmodified',
+            constraint=models.UniqueConstraint(fields=('scope', 'obj_id'), name='unique_last_modified'),
+        ),
+    ]
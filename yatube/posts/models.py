@@ -1,9 +1,31 @@
+from functools import reduce
+from operator import or_
+
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import F, Q
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
 
 User = get_user_model()
 
+# Поля, которые читают карточки постов в лентах.
+FEED_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'image',
+    'thumbnail',
+    'image_variants',
+    'version',
+    'comment_count',
+    'last_comment_at',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+)
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -19,6 +41,39 @@ class Group(models.Model):
         return self.title
 
 
+def comment_stats():
+    """Число комментариев поста и время последнего - подзапросами
+    к Comment по индексу (post, created)."""
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by()
+    return {
+        'comment_count': Coalesce(Subquery(
+            comments.values('post').annotate(
+                count=Count('id')).values('count')
+        ), 0),
+        'last_comment_at': Subquery(
+            comments.order_by('-created').values('created')[:1]),
+    }
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа подтягиваются JOIN-ом,
+        читаются только нужные шаблону колонки. Число комментариев
+        хранится в самом посте, поэтому ни подзапросов, ни GROUP BY:
+        база идёт по индексам лент."""
+        return self.select_related('author', 'group').only(
+            *FEED_FIELDS
+        ).order_by('-pub_date', '-id')
+
+    def with_comment_stats(self):
+        """Счётчики комментариев, посчитанные по таблице Comment:
+        actual_comment_count и actual_last_comment_at."""
+        return self.annotate(**{
+            f'actual_{name}': expression
+            for name, expression in comment_stats().items()
+        })
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -48,15 +103,101 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnail = models.ImageField(
+        verbose_name='Миниатюра',
+        help_text='Генерируется в фоне после загрузки картинки',
+        upload_to='posts/thumbs/',
+        blank=True,
+        editable=False
+    )
+    image_variants = models.JSONField(
+        verbose_name='Варианты картинки',
+        help_text='Файлы картинки разной ширины и формата для srcset',
+        default=list,
+        blank=True,
+        editable=False
+    )
+    version = models.PositiveIntegerField(
+        verbose_name='Версия',
+        help_text='Увеличивается при редактировании, входит в ключ кэша',
+        default=1,
+        editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False
+    )
+    last_comment_at = models.DateTimeField(
+        verbose_name='Последний комментарий',
+        blank=True,
+        null=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # По индексу на каждую ленту: фильтр + сортировка ленты.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def comment_added(cls, post_id, created, count=1):
+        """Учитывает новые комментарии одним UPDATE с F(): параллельные
+        комментарии не теряются. Версия меняется, чтобы обновилась
+        закэшированная карточка."""
+        cls.objects.filter(pk=post_id).update(
+            comment_count=F('comment_count') + count,
+            last_comment_at=created,
+            version=F('version') + 1,
+        )
+
+    @classmethod
+    def comment_deleted(cls, post_id, count=1):
+        """Учитывает удалённые комментарии: счётчик уменьшается через F(),
+        время последнего берётся по оставшимся комментариям."""
+        cls.objects.filter(pk=post_id).update(
+            comment_count=Greatest(F('comment_count') - count, 0),
+            last_comment_at=comment_stats()['last_comment_at'],
+            version=F('version') + 1,
+        )
+
+    @classmethod
+    def refresh_comment_stats(cls, post_ids):
+        """Пересчитывает счётчики комментариев постов по таблице Comment,
+        например после удаления комментариев."""
+        return cls.objects.filter(pk__in=post_ids).update(
+            **comment_stats(), version=F('version') + 1)
+
+    def picture_sources(self):
+        """Источники для <picture>: MIME-тип и srcset каждого формата."""
+        storage = self.image.storage
+        return [
+            {
+                'type': variant['type'],
+                'srcset': ', '.join(
+                    f'{storage.url(name)} {width}w'
+                    for width, name in variant['files']
+                ),
+            }
+            for variant in self.image_variants
+        ]
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -80,6 +221,13 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -100,3 +248,142 @@ class Follow(models.Model):
             models.CheckConstraint(
                 check=~Q(user=F('author')), name='user_not_author')
         ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора. Обновляются сигналами на
+    создание и удаление постов, пересобираются командой
+    rebuild_author_stats."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    @classmethod
+    def get_posts_count(cls, author_id):
+        """Читает счётчик; если строки ещё нет, считает посты один раз
+        и сохраняет результат."""
+        count = cls.objects.filter(author_id=author_id).values_list(
+            'posts_count', flat=True).first()
+        if count is None:
+            stats, _ = cls.objects.get_or_create(
+                author_id=author_id,
+                defaults={
+                    'posts_count': Post.objects.filter(
+                        author_id=author_id).count()
+                }
+            )
+            count = stats.posts_count
+        return count
+
+    @classmethod
+    def change_posts_count(cls, author_id, delta):
+        with transaction.atomic():
+            stats = cls.objects.filter(author_id=author_id)
+            if delta < 0:
+                stats = stats.filter(posts_count__gte=-delta)
+            updated = stats.update(posts_count=F('posts_count') + delta)
+            if not updated and delta > 0:
+                cls.get_posts_count(author_id)
+
+
+class LastModified(models.Model):
+    """Время последнего изменения страниц по областям: общая лента
+    ('global'), группа, автор, подписки читателя, пост. Обновляется вместе
+    со счётчиками поколений кэша (caching.bump); по нему views отвечают
+    на условные GET-запросы, не рендеря страницу."""
+    scope = models.CharField(
+        verbose_name='Область',
+        max_length=16,
+    )
+    obj_id = models.PositiveIntegerField(
+        verbose_name='Id объекта',
+        default=0,
+    )
+    modified = models.DateTimeField(
+        verbose_name='Время изменения',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'obj_id'], name='unique_last_modified'),
+        ]
+
+    # Областей в одном UPDATE: длинная цепочка OR упирается в предел
+    # глубины выражения SQLite.
+    TOUCH_BATCH_SIZE = 100
+
+    @classmethod
+    def touch(cls, *scopes):
+        """Отмечает изменение областей вида (scope,) и (scope, obj_id):
+        один UPDATE, а для новых областей - ещё INSERT."""
+        keys = sorted({(scope[0], scope[1] if len(scope) > 1 else 0)
+                       for scope in scopes})
+        now = timezone.now()
+        for start in range(0, len(keys), cls.TOUCH_BATCH_SIZE):
+            batch = keys[start:start + cls.TOUCH_BATCH_SIZE]
+            rows = cls.objects.filter(reduce(or_, (
+                Q(scope=scope, obj_id=obj_id) for scope, obj_id in batch)))
+            if rows.update(modified=now) < len(batch):
+                # Обновлённые строки INSERT пропустит по уникальному ключу.
+                cls.objects.bulk_create(
+                    [cls(scope=scope, obj_id=obj_id, modified=now)
+                     for scope, obj_id in batch],
+                    ignore_conflicts=True)
+
+    @classmethod
+    def touch_all(cls):
+        """Отмечает изменение всех областей, у которых есть строка, одним
+        UPDATE - после массовой загрузки, когда обходить области по одной
+        слишком долго."""
+        cls.objects.update(modified=timezone.now())
+        cls.touch(('global',))
+
+
+class TimelineEntry(models.Model):
+    """Запись предвычисленной ленты подписок (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'], name='timeline_user_date_idx'),
+        ]
@@ -0,0 +1,221 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator:
+    """Keyset-пагинация: страница выбирается условием по ключу сортировки,
+    без COUNT(*) и OFFSET, поэтому стоимость не растёт с номером страницы."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+
+    @property
+    def fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def get_page(self, cursor=None):
+        """Возвращает страницу по токену; битый токен ведёт на первую."""
+        position, backwards = None, False
+        if cursor:
+            try:
+                position, backwards = self.decode_cursor(cursor)
+            except InvalidCursor:
+                position, backwards = None, False
+        return CursorPage(self, position, backwards)
+
+    def encode_cursor(self, obj, backwards=False):
+        values = []
+        for name in self.fields:
+            value = getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps([int(backwards), values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            backwards, values = json.loads(base64.urlsafe_b64decode(padded))
+        except (ValueError, TypeError, binascii.Error):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        position = [
+            self._to_python(name, value)
+            for name, value in zip(self.fields, values)
+        ]
+        return position, bool(backwards)
+
+    def _to_python(self, name, value):
+        """Значение ключа из токена в тип поля или аннотации (например,
+        rank поиска); неподходящее значение - InvalidCursor."""
+        if value is None or isinstance(value, (list, dict)):
+            raise InvalidCursor(value)
+        queryset = self.object_list
+        try:
+            annotation = queryset.query.annotations.get(name)
+            if annotation is not None:
+                field = annotation.output_field
+            else:
+                field = queryset.model._meta.get_field(name)
+            return field.to_python(value)
+        except FieldDoesNotExist:
+            return value
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor(value)
+
+    def keyset_filter(self, position, backwards=False):
+        """Условие «строго после позиции» в порядке self.ordering:
+        (a < x) OR (a = x AND b < y) OR ..."""
+        condition = Q()
+        for i, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            if backwards:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+            prefix = {
+                field: value
+                for field, value in zip(self.fields[:i], position[:i])
+            }
+            prefix[f'{name.lstrip("-")}__{lookup}'] = position[i]
+            condition |= Q(**prefix)
+        return condition
+
+    def reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+
+class CursorPage(Sequence):
+    """Страница keyset-пагинации. Запрос выполняется лениво, при первом
+    обращении к записям."""
+
+    is_cursor = True
+
+    def __init__(self, paginator, position=None, backwards=False):
+        self.paginator = paginator
+        self.position = position
+        self.backwards = backwards
+        self._object_list = None
+        self._has_next = False
+        self._has_previous = False
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def object_list(self):
+        if self._object_list is None:
+            self._fetch()
+        return self._object_list
+
+    def _fetch(self):
+        paginator = self.paginator
+        queryset = paginator.object_list
+        if self.position is not None:
+            queryset = queryset.filter(
+                paginator.keyset_filter(self.position, self.backwards))
+        if self.backwards:
+            queryset = queryset.order_by(*paginator.reversed_ordering())
+        else:
+            queryset = queryset.order_by(*paginator.ordering)
+        rows = list(queryset[:paginator.per_page + 1])
+        has_more = len(rows) > paginator.per_page
+        rows = rows[:paginator.per_page]
+        if self.backwards:
+            rows.reverse()
+            self._has_previous = has_more
+            self._has_next = True
+        else:
+            self._has_next = has_more
+            self._has_previous = self.position is not None
+        self._object_list = rows
+
+    def has_next(self):
+        self.object_list
+        return self._has_next
+
+    def has_previous(self):
+        self.object_list
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(
+            self.object_list[0], backwards=True)
+
+
+def estimate_count(model, using='default'):
+    """Оценка числа строк таблицы из статистики СУБД, без COUNT(*).
+    None, если статистики нет (для SQLite её собирает ANALYZE)."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass'
+    else:
+        return None
+    try:
+        # Ошибка не должна прервать внешнюю транзакцию.
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки: число строк всей большой таблицы берётся
+    из статистики СУБД. С фильтром или поиском считается точно."""
+
+    exact_count_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+        return super().count
@@ -0,0 +1,149 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой POST_SEARCH_BACKEND: 'sqlite' (FTS5),
+'postgresql' (tsvector + GIN-индекс), 'like' (перебор LIKE '%...%')
+или None - по СУБД подключения. Индекс обновляется триггерами базы,
+поэтому не отстаёт и при bulk_create, и при правке поста через update().
+Таблица и триггеры создаются после каждой миграции (post_migrate):
+SQLite пересоздаёт posts_post при изменении полей, и триггеры теряются.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+# Слова запроса: буквы и цифры любого алфавита
+WORD_RE = re.compile(r'\w+')
+
+
+def query_words(query):
+    return WORD_RE.findall(query or '')[:settings.POST_SEARCH_MAX_WORDS]
+
+
+class BaseSearch:
+    # Сортировка выдачи и ключ keyset-пагинации: релевантность, затем id.
+    ordering = ('-rank', '-id')
+
+    def install(self, connection):
+        """Создаёт индекс и триггеры, если их ещё нет."""
+
+    def search(self, queryset, query):
+        """Посты, подходящие под запрос, с аннотацией rank:
+        чем больше, тем релевантнее. Пустой запрос ничего не находит."""
+        words = query_words(query)
+        if not words:
+            return queryset.annotate(
+                rank=Value(0.0, output_field=FloatField())).none()
+        return self.filter(queryset, words)
+
+    def filter(self, queryset, words):
+        raise NotImplementedError
+
+
+class LikeSearch(BaseSearch):
+    """Перебор всех постов; нужен для сравнения и для других СУБД."""
+    ordering = ('-id',)
+
+    def filter(self, queryset, words):
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset.annotate(rank=F('id'))
+
+
+class SqliteSearch(BaseSearch):
+    """Внешняя таблица FTS5 поверх posts_post: хранит только индекс."""
+    table = 'posts_post_fts'
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                'AND name = %s', [self.table])
+            created = cursor.fetchone() is None
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                "USING fts5(text, content='posts_post', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')")
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_insert '
+                'AFTER INSERT ON posts_post BEGIN '
+                f'INSERT INTO {self.table}(rowid, text) '
+                'VALUES (new.id, new.text); END')
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_delete '
+                'AFTER DELETE ON posts_post BEGIN '
+                f'INSERT INTO {self.table}({self.table}, rowid, text) '
+                "VALUES ('delete', old.id, old.text); END")
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {self.table}_update '
+                'AFTER UPDATE OF text ON posts_post BEGIN '
+                f'INSERT INTO {self.table}({self.table}, rowid, text) '
+                "VALUES ('delete', old.id, old.text); "
+                f'INSERT INTO {self.table}(rowid, text) '
+                'VALUES (new.id, new.text); END')
+            if created:
+                cursor.execute(
+                    f"INSERT INTO {self.table}({self.table}) "
+                    "VALUES ('rebuild')")
+
+    @staticmethod
+    def match(words):
+        # Каждое слово - в кавычках, чтобы не сработал синтаксис FTS5,
+        # и с * - чтобы «пост» находил «поста» и «постами».
+        return ' '.join('"{}"*'.format(word) for word in words)
+
+    def filter(self, queryset, words):
+        # Таблица индекса присоединяется к запросу: MATCH выполняется один
+        # раз, а rank (bm25) читается из той же строки. bm25 тем меньше,
+        # чем релевантнее, поэтому со знаком минус.
+        return queryset.extra(
+            tables=[self.table],
+            where=[
+                f'{self.table} MATCH %s',
+                f'{self.table}.rowid = "posts_post"."id"',
+            ],
+            params=[self.match(words)],
+        ).annotate(rank=RawSQL(
+            f'-{self.table}.rank', (), output_field=FloatField()))
+
+
+class PostgresSearch(BaseSearch):
+    """to_tsvector по тексту поста с GIN-индексом по тому же выражению."""
+    vector = "to_tsvector('russian', {})"
+    tsquery = "plainto_tsquery('russian', %s)"
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS posts_post_text_search_idx '
+                f'ON posts_post USING GIN ({self.vector.format("text")})')
+
+    def filter(self, queryset, words):
+        text = ' '.join(words)
+        # Условие повторяет выражение индекса, иначе индекс не используется.
+        matches = RawSQL(
+            f'SELECT id FROM posts_post '
+            f'WHERE {self.vector.format("text")} @@ {self.tsquery}',
+            (text,),
+        )
+        column = '"posts_post"."text"'
+        rank = RawSQL(
+            f'ts_rank({self.vector.format(column)}, {self.tsquery})',
+            (text,),
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(rank=rank)
+
+
+BACKENDS = {
+    'like': LikeSearch,
+    'sqlite': SqliteSearch,
+    'postgresql': PostgresSearch,
+}
+
+
+def get_search(vendor=None):
+    backend = settings.POST_SEARCH_BACKEND or vendor or connection.vendor
+    return BACKENDS.get(backend, LikeSearch)()
@@ -0,0 +1,85 @@
+from django.db import connections
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save)
+from django.dispatch import receiver
+
+from . import caching, search, timeline
+from .metrics import COMMENTS_CREATED, POSTS_CREATED
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    # Группа на момент загрузки: при смене группы сбрасывается и старая
+    # лента. __dict__ - чтобы не подгружать отложенное поле.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.change_posts_count(instance.author_id, 1)
+        timeline.fan_out(instance)
+        POSTS_CREATED.inc()
+    caching.bump_post_feeds(
+        instance.author_id, instance.group_id, instance._loaded_group_id,
+        post_id=instance.pk)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    AuthorStats.change_posts_count(instance.author_id, -1)
+    caching.bump_post_feeds(
+        instance.author_id, instance.group_id, instance._loaded_group_id,
+        post_id=instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        COMMENTS_CREATED.inc()
+        Post.comment_added(instance.post_id, instance.created)
+    # Ленты не сбрасываются: число комментариев в них обновится со сменой
+    # окна caching.counts_window.
+    caching.bump(('post', instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # Удаление любым путём: из админки, каскадом вместе с автором. При
+    # удалении поста его комментарии удаляются раньше него, и UPDATE
+    # удаляемого поста лишний, но безвреден.
+    Post.comment_deleted(instance.post_id)
+    caching.bump(('post', instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump(('group', instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    user_timeline = timeline.get_timeline()
+    if created and user_timeline is not None:
+        user_timeline.backfill(instance.user_id, instance.author_id)
+    caching.bump(('follow', instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    user_timeline = timeline.get_timeline()
+    if user_timeline is not None:
+        user_timeline.prune(instance.user_id, instance.author_id)
+    caching.bump(('follow', instance.user_id))
+
+
+@receiver(post_migrate)
+def install_search(sender, using, **kwargs):
+    if sender.name != 'posts':
+        return
+    connection = connections[using]
+    if 'posts_post' in connection.introspection.table_names():
+        search.get_search(connection.vendor).install(connection)
@@ -0,0 +1,47 @@
+from django import template
+from django.template.base import NodeList
+from django.templatetags.cache import CacheNode
+
+from ..metrics import FEED_CACHE
+
+register = template.Library()
+
+
+class FragmentNodeList(NodeList):
+    """Содержимое фрагмента: рендерится только при промахе кэша."""
+
+    def render(self, context):
+        context.render_context[id(self)] = True
+        return super().render(context)
+
+
+class FeedCacheNode(CacheNode):
+    def render(self, context):
+        value = super().render(context)
+        key = id(self.nodelist)
+        missed = context.render_context.get(key, False)
+        if missed:
+            del context.render_context[key]
+        FEED_CACHE.inc(
+            cache=self.fragment_name, result='miss' if missed else 'hit')
+        return value
+
+
+@register.tag('feed_cache')
+def do_feed_cache(parser, token):
+    """{% cache %}, который считает попадания и промахи в метрику
+    yatube_feed_cache_requests_total:
+
+        {% feed_cache [expire_time] [fragment_name] [var1] .. %}
+            ...
+        {% endfeed_cache %}
+    """
+    nodelist = FragmentNodeList(parser.parse(('endfeed_cache',)))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.')
+    return FeedCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(t) for t in tokens[3:]], None)
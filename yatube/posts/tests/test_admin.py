@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Comment, Follow, Group, Post
+from ..paginator import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTest(TestCase):
+    """Списки в админке не делают запросов на каждую строку."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'Author_{i}')
+            post = Post.objects.create(
+                author=author, text=f'Пост {i}', group=self.group)
+            Comment.objects.create(post=post, author=author, text='Текст')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def test_changelist_query_count_is_constant(self):
+        urls = (
+            '/admin/posts/post/',
+            '/admin/posts/comment/',
+            '/admin/posts/follow/',
+            '/admin/posts/post/?q=пост',
+            '/admin/posts/comment/?q=Author_1',
+        )
+        self.create_rows(2)
+        queries = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url)
+            queries[url] = len(context.captured_queries)
+        self.create_rows(5)
+        for url in urls:
+            with self.subTest(url=url), self.assertNumQueries(queries[url]):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_search_by_username_is_exact(self):
+        self.create_rows(12)
+        response = self.client.get('/admin/posts/comment/?q=Author_1')
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_large_table_count_is_estimated(self):
+        self.create_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with mock.patch.object(
+                EstimatedCountPaginator, 'exact_count_limit', 1):
+            Post.objects.create(author=self.admin, text='Ещё пост')
+            response = self.client.get('/admin/posts/post/')
+            self.assertEqual(response.context['cl'].result_count, 3)
+            response = self.client.get('/admin/posts/post/?q=пост')
+            self.assertEqual(response.context['cl'].result_count, 4)
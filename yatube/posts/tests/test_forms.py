@@ -1,19 +1,34 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
-from ..models import Comment, Group, Post
+from ..models import Comment, Follow, Group, Post
+from ..writebehind import WRITE_ATTEMPTS, WriteBehindQueue
 
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTests(TestCase):
@@ -93,6 +108,86 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    @override_settings(POST_IMAGE_WORKERS=0)
+    def test_create_post_generates_thumbnail(self):
+        """После сохранения поста с картинкой создаётся миниатюра."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост с картинкой', 'image': uploaded},
+            )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertTrue(post.thumbnail.name.startswith('posts/thumbs/'))
+        with Image.open(post.thumbnail.path) as thumbnail:
+            self.assertEqual(
+                thumbnail.size, settings.POST_THUMBNAIL_SIZE)
+        self.assertIn(
+            {'type': 'image/webp', 'srcset': (
+                f'{settings.MEDIA_URL}posts/variants/thumb_480.webp 480w, '
+                f'{settings.MEDIA_URL}posts/variants/thumb_960.webp 960w'
+            )},
+            post.picture_sources()
+        )
+
+    def test_generate_post_images_command(self):
+        """Команда создаёт варианты для уже загруженных картинок."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Старый пост',
+            image=SimpleUploadedFile('old.gif', SMALL_GIF, 'image/gif'),
+        )
+        call_command('generate_post_images', workers=2, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        widths = {
+            variant['type']: [width for width, _ in variant['files']]
+            for variant in post.image_variants
+        }
+        self.assertEqual(widths['image/jpeg'], [480, 960])
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, '<source type="image/webp"')
+
+    def create_post_with_image(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image},
+        )
+
+    def test_upload_limits(self):
+        """Файл больше лимита по байтам или пикселям отклоняется
+        с ошибкой в форме."""
+        limits = {
+            'POST_IMAGE_MAX_BYTES': (10, 'Файл слишком большой'),
+            'POST_IMAGE_MAX_PIXELS': (1, 'Слишком большое разрешение'),
+        }
+        for setting, (value, error) in limits.items():
+            with self.subTest(setting=setting), override_settings(
+                    **{setting: value}):
+                post_count = Post.objects.count()
+                response = self.create_post_with_image(SimpleUploadedFile(
+                    'big.gif', SMALL_GIF, content_type='image/gif'))
+                self.assertEqual(Post.objects.count(), post_count)
+                self.assertIn(
+                    error, response.context['form'].errors['image'][0])
+
+    def test_upload_strips_exif(self):
+        """EXIF удаляется из загруженной картинки."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, 'JPEG', exif=exif.tobytes())
+        self.create_post_with_image(SimpleUploadedFile(
+            'exif.jpg', buffer.getvalue(), content_type='image/jpeg'))
+        post = Post.objects.get(text='Пост с картинкой')
+        with Image.open(post.image.path) as image:
+            self.assertFalse(image.getexif())
+
     def test_edit_post_authorized_user(self):
         """Валидная форма редактирует запись в Post."""
         post_count = Post.objects.count()
@@ -205,3 +300,105 @@ class CommentFormFormTests(TestCase):
             'users:login') + '?next=' + reverse('posts:add_comment', kwargs={
                 'post_id': self.post.id}))
         self.assertEqual(Comment.objects.count(), comment_count)
+
+
+# Пачки пишет сам тест: фоновый поток шёл бы в базу своим соединением
+# и не видел бы данных теста.
+@mock.patch.object(WriteBehindQueue, 'start')
+class WriteBehindTests(TestCase):
+    """Комментарии и подписки через очередь WRITE_BEHIND."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': text})
+
+    @override_settings(WRITE_BEHIND='async', WRITE_BEHIND_FLUSH_INTERVAL=60)
+    def test_async_comments_are_visible_to_author(self, start):
+        responses = [self.comment(f'Комментарий {i}') for i in range(3)]
+        self.assertFalse(Comment.objects.exists())
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.assertTrue(responses[-1].url.startswith(url + '?written='))
+
+        # Страница по ссылке из ответа дожидается записи пачки.
+        response = self.client.get(responses[-1].url)
+        self.assertContains(response, 'Комментарий 2')
+        self.assertEqual(Comment.objects.count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(
+            self.post.last_comment_at,
+            Comment.objects.latest('created').created)
+
+    @override_settings(WRITE_BEHIND='async', WRITE_BEHIND_FLUSH_INTERVAL=60)
+    def test_async_follow_ignores_duplicates(self, start):
+        url = reverse('posts:profile_follow',
+                      kwargs={'username': self.author.username})
+        self.client.post(url)
+        response = self.client.post(url)
+        response = self.client.get(response.url)
+        self.assertTrue(response.context['following'])
+        self.assertEqual(Follow.objects.count(), 1)
+
+    @override_settings(WRITE_BEHIND='commit', WRITE_BEHIND_FLUSH_INTERVAL=0)
+    def test_commit_mode_writes_before_response(self, start):
+        response = self.comment('Комментарий')
+        self.assertRedirects(response, reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def locked(self):
+        return mock.patch('posts.writebehind.insert', side_effect=(
+            OperationalError('database is locked')))
+
+    @override_settings(WRITE_BEHIND='commit', WRITE_BEHIND_FLUSH_INTERVAL=0)
+    def test_commit_mode_failed_batch_fails_every_request(self, start):
+        queue = WriteBehindQueue()
+        others = [
+            queue.put(Comment(author=self.user, post=self.post, text='Тест'))
+            for _ in range(4)
+        ]
+        with self.locked(), self.assertRaises(OperationalError):
+            queue.save(Comment(author=self.user, post=self.post, text='Тест'))
+        for item in others:
+            self.assertTrue(item.done.is_set())
+            self.assertIsInstance(item.error, OperationalError)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(WRITE_BEHIND='async', WRITE_BEHIND_FLUSH_INTERVAL=60)
+    def test_async_mode_retries_failed_batch(self, start):
+        queue = WriteBehindQueue()
+        token = queue.save(
+            Comment(author=self.user, post=self.post, text='Тест'))
+        with self.locked():
+            queue.flush()
+        self.assertTrue(queue.pending(token))
+
+        queue.flush()
+        self.assertFalse(queue.pending(token))
+        self.assertEqual(Comment.objects.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    @override_settings(WRITE_BEHIND='async', WRITE_BEHIND_FLUSH_INTERVAL=60)
+    def test_async_mode_drops_batch_after_attempts(self, start):
+        queue = WriteBehindQueue()
+        token = queue.save(
+            Comment(author=self.user, post=self.post, text='Тест'))
+        with self.locked(), self.assertLogs('posts.writebehind', 'ERROR'):
+            for _ in range(WRITE_ATTEMPTS):
+                queue.flush()
+        self.assertFalse(queue.pending(token))
+        self.assertFalse(Comment.objects.exists())
@@ -1,7 +1,18 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import transaction
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import caching
+from ..models import (AuthorStats, Comment, Follow, Group, LastModified,
+                      Post)
 
 User = get_user_model()
 
@@ -58,3 +69,188 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(result._meta.get_field(
                     field).help_text, expected_value)
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_posts_count_follows_create_and_delete(self):
+        """Счётчик постов растёт при создании и падает при удалении."""
+        post = Post.objects.create(author=self.user, text='Первый')
+        Post.objects.create(author=self.user, text='Второй')
+        self.assertEqual(AuthorStats.get_posts_count(self.user.id), 2)
+
+        post.delete()
+        self.assertEqual(AuthorStats.get_posts_count(self.user.id), 1)
+
+    def test_missing_stats_are_counted_once(self):
+        """Без строки AuthorStats счётчик вычисляется и сохраняется."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=str(i)) for i in range(3))
+        self.assertFalse(AuthorStats.objects.exists())
+        self.assertEqual(AuthorStats.get_posts_count(self.user.id), 3)
+        self.assertEqual(self.user.stats.posts_count, 3)
+
+    def test_rebuild_author_stats_command(self):
+        """Команда rebuild_author_stats пересчитывает счётчики с нуля."""
+        Post.objects.create(author=self.user, text='Пост')
+        AuthorStats.objects.filter(author=self.user).update(posts_count=42)
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(AuthorStats.get_posts_count(self.user.id), 1)
+
+
+class CommentStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def test_comment_count_follows_comments(self):
+        first = Comment.objects.create(
+            post=self.post, author=self.user, text='Первый')
+        last = Comment.objects.create(
+            post=self.post, author=self.user, text='Второй')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_comment_at, last.created)
+
+        last.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_comment_at, first.created)
+
+    def test_deleting_commenter_updates_counts(self):
+        """Комментарии удалённого пользователя к чужим постам."""
+        reader = User.objects.create_user(username='reader')
+        first = Comment.objects.create(
+            post=self.post, author=self.user, text='Первый')
+        for text in ('Второй', 'Третий'):
+            Comment.objects.create(post=self.post, author=reader, text=text)
+        reader.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_comment_at, first.created)
+
+    def test_deleting_post_with_comments(self):
+        post = Post.objects.create(author=self.user, text='Другой')
+        Comment.objects.create(post=post, author=self.user, text='Ого')
+        post.delete()
+        self.assertFalse(Comment.objects.filter(post_id=post.pk).exists())
+        # Неудавшееся удаление не влияет на счётчики других комментариев.
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Ого')
+        with mock.patch('posts.signals.AuthorStats.change_posts_count',
+                        side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError), transaction.atomic():
+            self.post.delete()
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    @mock.patch.object(caching, 'counts_window', return_value=0)
+    def test_comment_does_not_reset_feeds(self, counts_window):
+        """Комментарий сбрасывает кэш страницы поста, но не лент."""
+        feed = caching.feed_version(('global',), ('author', self.user.id))
+        post_page = caching.feed_version(('post', self.post.id))
+        Comment.objects.create(post=self.post, author=self.user, text='Ого')
+        self.assertEqual(
+            caching.feed_version(('global',), ('author', self.user.id)),
+            feed)
+        self.assertNotEqual(
+            caching.feed_version(('post', self.post.id)), post_page)
+
+    def test_feed_reads_counts_without_joins(self):
+        Comment.objects.create(post=self.post, author=self.user, text='Ого')
+        feed = Post.objects.for_feed()
+        self.assertNotIn('posts_comment', str(feed.query))
+        self.assertEqual(feed.get(pk=self.post.pk).comment_count, 1)
+
+    def test_rebuild_comment_stats_command(self):
+        """Команда rebuild_comment_stats исправляет расхождения."""
+        Comment.objects.create(post=self.post, author=self.user, text='Ого')
+        Post.objects.filter(pk=self.post.pk).update(
+            comment_count=42, last_comment_at=None)
+        out = StringIO()
+        call_command('rebuild_comment_stats', batch_size=1, stdout=out)
+        self.assertIn('Исправлено постов: 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertIsNotNone(self.post.last_comment_at)
+
+
+class DataTransferTest(TestCase):
+    """Выгрузка export_data и загрузка import_data."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='С группой', group=cls.group)
+        Post.objects.create(author=cls.user, text='Без группы')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ого')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def snapshot(self):
+        return [
+            list(model.objects.order_by('pk').values())
+            for model in (User, Group, Post, Comment, Follow)
+        ]
+
+    def clear(self):
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+
+    def test_round_trip(self):
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(format=fmt):
+                path = os.path.join(self.path, fmt)
+                expected = self.snapshot()
+                call_command('export_data', path, format=fmt,
+                             stdout=StringIO())
+                self.clear()
+                call_command('import_data', path, batch_size=1,
+                             stdout=StringIO())
+                self.assertEqual(self.snapshot(), expected)
+                self.assertEqual(AuthorStats.get_posts_count(self.user.id), 2)
+
+    def test_import_resets_feed_caches(self):
+        call_command('export_data', self.path, stdout=StringIO())
+        scope = ('group', self.group.id)
+        version = caching.feed_version(scope)
+        modified = LastModified.objects.get(
+            scope='group', obj_id=self.group.id).modified
+        call_command('import_data', self.path, stdout=StringIO())
+        self.assertNotEqual(caching.feed_version(scope), version)
+        self.assertGreater(
+            LastModified.objects.get(
+                scope='group', obj_id=self.group.id).modified,
+            modified)
+
+    def test_resume_skips_loaded_rows(self):
+        call_command('export_data', self.path, stdout=StringIO())
+        Post.objects.exclude(pk=self.post.pk).delete()
+        # Первая строка постов уже загружена, вторая - нет.
+        with open(os.path.join(self.path, '.import-progress.json'), 'w') as f:
+            json.dump({'posts': 1}, f)
+        self.post.text = 'Изменён после выгрузки'
+        self.post.save()
+        call_command('import_data', self.path, resume=True, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).text, 'Изменён после выгрузки')
+        self.assertFalse(
+            os.path.exists(os.path.join(self.path, '.import-progress.json')))
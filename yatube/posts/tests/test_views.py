@@ -1,15 +1,25 @@
+import base64
+import json
 import shutil
 import tempfile
+from http import HTTPStatus
 
+from asgiref.sync import async_to_sync
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.http import Http404
+from django.test import (Client, RequestFactory, TestCase,
+                         TransactionTestCase, override_settings)
 from django.urls import reverse
 from django.core.cache import cache
 
-from ..models import Group, Post, Follow
+from yatube.settings import COUNT_COMMENTS_FOR_PAGE, COUNT_POST_FOR_PAGE
+
+from .. import async_views
+from ..models import Comment, Group, Post, Follow
 
 User = get_user_model()
 
@@ -143,16 +153,37 @@ class PostsPagesTests(TestCase):
 
         self.assertEqual(response.context['post'].id, self.post.id)
 
-    def test_index_page_cache_delete_content(self):
-        """При удалении записи из базы, кэш остаётся в response.content
-        главной страницы."""
+    def test_index_page_cache_keeps_content(self):
+        """Пока поколение ленты не изменилось, главная страница отдаётся
+        из кэша."""
         old_content = self.authorized_client_1.get(
             reverse('posts:index')).content
-        Post.objects.filter(id=self.post.id).delete()
+        Post.objects.filter(id=self.post.id).update(text='Другой текст')
         new_content = self.authorized_client_1.get(
             reverse('posts:index')).content
         self.assertEqual(old_content, new_content)
 
+    def test_feed_cache_invalidated_by_post_changes(self):
+        """Новый или удалённый пост сразу меняет кэшированные ленты."""
+        Follow.objects.create(user=self.user_2, author=self.user_1)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user_1}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.authorized_client_2.get(url)
+                post = Post.objects.create(
+                    author=self.user_1, text='Свежий пост', group=self.group)
+                response = self.authorized_client_2.get(url)
+                self.assertContains(response, 'Свежий пост')
+
+                post.delete()
+                response = self.authorized_client_2.get(url)
+                self.assertNotContains(response, 'Свежий пост')
+
     def test_index_page_clear_cache_delete_content(self):
         """При удалении записи из базы, и очистки кэша, он не остается
         в response.content главной страницы."""
@@ -164,6 +195,31 @@ class PostsPagesTests(TestCase):
             reverse('posts:index')).content
         self.assertNotEqual(old_content, new_content)
 
+    def test_post_card_refreshed_after_edit(self):
+        """После редактирования в лентах выводится новая версия карточки."""
+        self.authorized_client_1.get(reverse('posts:index'))
+        self.authorized_client_1.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Исправленный текст', 'group': self.group.id},
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 2)
+        response = self.authorized_client_1.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_post_card_refreshed_after_group_and_author_change(self):
+        """Карточка в ленте следует за slug группы и именем автора."""
+        cache.clear()
+        self.authorized_client_1.get(reverse('posts:index'))
+        Group.objects.filter(pk=self.group.pk).update(slug='new-slug')
+        User.objects.filter(pk=self.user_1.pk).update(first_name='Новое')
+        # Новый пост сбрасывает фрагмент ленты, карточки берутся из кэша.
+        Post.objects.create(author=self.user_2, text='Свежий пост')
+        response = self.authorized_client_1.get(reverse('posts:index'))
+        self.assertContains(response, '/group/new-slug/')
+        self.assertNotContains(response, f'/group/{self.group.slug}/')
+        self.assertContains(response, 'Новое')
+
     def test_authorized_user_follow_other_users(self):
         """Авторизованный пользователь может подписываться на других
         пользователей."""
@@ -260,3 +316,430 @@ class PaginatorViewsTest(TestCase):
                 response = self.authorized_client.get(value + '?page=2')
                 self.assertEqual(
                     len(response.context[expected]), count_posts_second_page)
+
+    def test_cursor_pages_follow_next_and_previous_links(self):
+        """Keyset-пагинация: курсоры ведут на следующую и предыдущую
+        страницы без пропусков и повторов."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.post[0].author}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                first_page = self.authorized_client.get(
+                    url).context['page_obj']
+                self.assertTrue(first_page.is_cursor)
+                self.assertTrue(first_page.has_next())
+                self.assertFalse(first_page.has_previous())
+
+                second_page = self.authorized_client.get(
+                    url, {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                self.assertFalse(
+                    set(first_page) & set(second_page))
+
+                previous_page = self.authorized_client.get(
+                    url, {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(
+                    list(previous_page), list(first_page))
+                self.assertFalse(previous_page.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Битый курсор не ломает страницу, а ведёт на первую."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_cursor_with_wrong_values_returns_first_page(self):
+        """Токен декодируется, но значения ключа не того типа."""
+        tokens = [
+            [0, ['2020-01-01T00:00:00+00:00', 'abc']],
+            [0, ['2020-01-01T00:00:00+00:00', [1]]],
+            [0, ['2020-01-01T00:00:00+00:00', None]],
+            [0, ['2020-13-45T00:00:00+00:00', 1]],
+            [0, ['abc', 1]],
+        ]
+        post_id = Post.objects.latest('id').id
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': post_id}),
+            reverse('posts:post_comments', kwargs={'post_id': post_id}),
+            reverse('posts:search') + '?q=Тестовый&',
+        ]
+        for url in urls:
+            for token in tokens:
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(token).encode()).decode()
+                separator = '' if url.endswith('&') else '?'
+                with self.subTest(url=url, token=token):
+                    response = self.authorized_client.get(
+                        f'{url}{separator}cursor={cursor}')
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'Author_{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group-{i}',
+                description='Описание',
+            )
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(author=author, text=f'Текст {i}', group=group)
+            Post.objects.create(author=self.author, text=f'Текст {i}',
+                                group=self.group)
+
+    def test_feed_query_count_is_constant(self):
+        # В index, group_posts и profile один запрос - время изменения
+        # страницы для ETag.
+        urls_queries = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_posts',
+                    kwargs={'slug': self.group.slug}): 5,
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}): 7,
+            reverse('posts:follow_index'): 3,
+        }
+        self.create_posts(COUNT_POST_FOR_PAGE)
+        for url, queries in urls_queries.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                self.assertEqual(
+                    len(response.context['page_obj']), COUNT_POST_FOR_PAGE)
+
+
+class ConditionalGetTest(TestCase):
+    """Неизменившиеся страницы отдаются ответом 304 без рендера."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_etag_changes_after_login(self):
+        """После повторного входа страница с формой комментария
+        не отдаётся ответом 304: в ней устаревший CSRF-токен."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.logout()
+        self.client.force_login(self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_pages_are_not_modified(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                modified = response['Last-Modified']
+                # Страница не рендерится: только запрос времени изменения.
+                with self.assertNumQueries(1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=modified)
+                self.assertEqual(response.status_code, 304)
+                # Другая страница ленты - другой ETag.
+                response = self.client.get(
+                    url, {'page': 2}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_changes_update_validators(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый пост')
+
+    def test_anonymous_pages_served_from_cache(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.client.get(url)
+        # Из кэша: только запрос времени изменения страницы.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertContains(response, 'Пост')
+        self.assertIn('Cookie', response['Vary'])
+
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.assertContains(self.client.get(url), 'Комментарий')
+
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(url), 'Добавить комментарий')
+
+    def test_reader_gets_own_etag(self):
+        url = reverse('posts:profile',
+                      kwargs={'username': self.author.username})
+        etag = self.client.get(url)['ETag']
+        reader = User.objects.create_user(username='Reader')
+        self.client.force_login(reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        Follow.objects.create(user=reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CommentsPaginationTest(TestCase):
+    """Комментарии выводятся страницами, остальные подгружаются."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(COUNT_COMMENTS_FOR_PAGE + 3):
+            commenter = User.objects.create_user(username=f'Commenter_{i}')
+            Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_post_detail_shows_first_comments_page(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        # Время изменения страницы, пост, счётчик постов автора, страница
+        # комментариев с авторами.
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COUNT_COMMENTS_FOR_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'Показать ещё комментарии')
+
+    def test_comments_endpoint_returns_next_page(self):
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        cursor = response.context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': cursor})
+        page = response.json()
+        self.assertIsNone(page['next_cursor'])
+        last = COUNT_COMMENTS_FOR_PAGE + 2
+        self.assertIn(f'Комментарий {last}', page['html'])
+        self.assertIn(f'Commenter_{last}', page['html'])
+        self.assertEqual(page['html'].count('media-body'), 3)
+
+
+class SearchTest(TestCase):
+    """Поиск по полнотекстовому индексу постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Котики захватили интернет')
+        Post.objects.create(author=cls.author, text='Про собак')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return response, list(response.context['page_obj'])
+
+    def test_search_finds_words_and_prefixes(self):
+        for query in ('котики', 'КОТИК интернет', 'захват'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query)[1], [self.post])
+        for query in ('котики собак', 'пингвины', '', '"*'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query)[1], [])
+
+    def test_search_index_follows_post_changes(self):
+        self.post.text = 'Пингвины на льдине'
+        self.post.save()
+        self.assertEqual(self.search('котики')[1], [])
+        self.assertEqual(self.search('пингвины')[1], [self.post])
+        self.post.delete()
+        self.assertEqual(self.search('пингвины')[1], [])
+
+    def test_search_ranking_and_pages(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Котики {i} и ещё много слов')
+            for i in range(COUNT_POST_FOR_PAGE)
+        )
+        best = Post.objects.create(author=self.author, text='Котики котики')
+        response, first_page = self.search('котики')
+        self.assertEqual(first_page[0], best)
+        self.assertEqual(len(first_page), COUNT_POST_FOR_PAGE)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA')
+        _, second_page = self.search(
+            'котики', cursor=response.context['page_obj'].next_cursor)
+        self.assertEqual(len(second_page), 2)
+        self.assertFalse(set(first_page) & set(second_page))
+
+
+class FollowTimelineTest(TestCase):
+    """Лента подписок, собранная раскладкой при публикации."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow_feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_timeline_backends(self):
+        for backend in ('db', 'cache'):
+            with self.subTest(backend=backend), override_settings(
+                    FOLLOW_TIMELINE_BACKEND=backend):
+                self.client.get(reverse(
+                    'posts:profile_follow',
+                    kwargs={'username': self.author.username}))
+                self.assertEqual(self.follow_feed(), [self.old_post])
+
+                new_post = Post.objects.create(
+                    author=self.author, text='Новый')
+                self.assertEqual(
+                    self.follow_feed(), [new_post, self.old_post])
+
+                self.client.get(reverse(
+                    'posts:profile_unfollow',
+                    kwargs={'username': self.author.username}))
+                self.assertEqual(self.follow_feed(), [])
+                new_post.delete()
+
+    @override_settings(
+        FOLLOW_TIMELINE_BACKEND='db', FOLLOW_TIMELINE_SIZE=2)
+    def test_db_timeline_is_bounded(self):
+        """Лента в БД не растёт больше FOLLOW_TIMELINE_SIZE."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+        self.assertEqual(len(self.follow_feed()), 2)
+        self.assertEqual(self.reader.timeline.count(), 2)
+
+    @override_settings(
+        FOLLOW_TIMELINE_BACKEND='db', FOLLOW_TIMELINE_MAX_FOLLOWING=0)
+    def test_large_follow_list_uses_query(self):
+        """При большом числе подписок лента строится запросом."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader.timeline.all().delete()
+        self.assertEqual(self.follow_feed(), [self.old_post])
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """Async-версии лент для ASGI отдают те же страницы, что и обычные.
+    TransactionTestCase: запросы async view идут из потоков пула со своими
+    соединениями и не видят данных незакоммиченной транзакции TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.reader = User.objects.create_user(username='Reader')
+        self.author = User.objects.create_user(username='Author')
+        self.group = Group.objects.create(
+            title='Группа', slug='test-slug', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост автора')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def get(self, view, user=None, **kwargs):
+        request = self.factory.get('/')
+        request.user = user or AnonymousUser()
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_pages(self):
+        pages = (
+            (async_views.index, {}, 'Пост автора'),
+            (async_views.group_posts, {'slug': 'test-slug'}, 'Пост автора'),
+            (async_views.profile, {'username': 'Author'}, 'Отписаться'),
+            (async_views.post_detail, {'post_id': self.post.id},
+             'Комментарий'),
+            (async_views.follow_index, {}, 'Пост автора'),
+        )
+        for view, kwargs, text in pages:
+            with self.subTest(view=view.__name__):
+                response = self.get(view, self.reader, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, text)
+                # Лента подписок не отвечает 304: она без conditional_page.
+                self.assertEqual(
+                    response.has_header('ETag'),
+                    view is not async_views.follow_index)
+
+    def test_missing_objects_and_anonymous_follow(self):
+        for view, kwargs in (
+            (async_views.group_posts, {'slug': 'missing'}),
+            (async_views.profile, {'username': 'missing'}),
+            (async_views.post_detail, {'post_id': self.post.id + 1}),
+        ):
+            with self.subTest(view=view.__name__), \
+                    self.assertRaises(Http404):
+                self.get(view, **kwargs)
+        response = self.get(async_views.follow_index)
+        self.assertRedirects(
+            response, '/auth/login/?next=/', fetch_redirect_response=False)
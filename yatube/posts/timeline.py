@@ -0,0 +1,181 @@
+"""Предвычисленная лента подписок (fan-out on write).
+
+Новый пост раскладывается по лентам подписчиков сразу при сохранении,
+а follow_index читает готовый список id вместо JOIN-а Follow и Post.
+Бэкенд выбирается настройкой FOLLOW_TIMELINE_BACKEND: 'db', 'cache'
+или None (лента строится запросом на лету).
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Post, TimelineEntry
+
+
+class BaseTimeline:
+    def __init__(self):
+        self.size = settings.FOLLOW_TIMELINE_SIZE
+
+    def latest_posts(self, user_id, author_id=None):
+        """Свежие посты авторов, на которых подписан пользователь, для
+        начального заполнения ленты."""
+        posts = Post.objects.order_by('-pub_date', '-id')
+        if author_id is None:
+            posts = posts.filter(author__following__user_id=user_id)
+        else:
+            posts = posts.filter(author_id=author_id)
+        return list(
+            posts.values_list('id', 'author_id', 'pub_date')[:self.size])
+
+    def push(self, post, user_ids):
+        raise NotImplementedError
+
+    def backfill(self, user_id, author_id):
+        raise NotImplementedError
+
+    def prune(self, user_id, author_id):
+        raise NotImplementedError
+
+    def rebuild(self, user_id):
+        raise NotImplementedError
+
+    def post_ids(self, user_id):
+        raise NotImplementedError
+
+
+class DatabaseTimeline(BaseTimeline):
+    def _create(self, user_id, rows):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for post_id, author_id, pub_date in rows
+            ],
+            ignore_conflicts=True,
+        )
+
+    def push(self, post, user_ids):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post.id,
+                    author_id=post.author_id,
+                    pub_date=post.pub_date,
+                )
+                for user_id in user_ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    def backfill(self, user_id, author_id):
+        self._create(user_id, self.latest_posts(user_id, author_id))
+
+    def prune(self, user_id, author_id):
+        TimelineEntry.objects.filter(
+            user_id=user_id, author_id=author_id).delete()
+
+    def rebuild(self, user_id):
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        self._create(user_id, self.latest_posts(user_id))
+
+    def post_ids(self, user_id):
+        entries = list(
+            TimelineEntry.objects.filter(user_id=user_id).order_by(
+                '-pub_date', '-post_id'
+            ).values_list('post_id', 'pub_date')[:self.size + 1]
+        )
+        if len(entries) > self.size:
+            # Лента переросла лимит: отрезаем хвост старше последней записи.
+            entries = entries[:self.size]
+            TimelineEntry.objects.filter(
+                user_id=user_id, pub_date__lt=entries[-1][1]).delete()
+        return [post_id for post_id, _ in entries]
+
+
+class CacheTimeline(BaseTimeline):
+    """Лента в кэше: список пар (post_id, author_id), новые в начале."""
+
+    def key(self, user_id):
+        return f'timeline:{user_id}'
+
+    def _store(self, user_id, rows):
+        cache.set(
+            self.key(user_id),
+            [(post_id, author_id) for post_id, author_id, _ in rows],
+            None,
+        )
+
+    def push(self, post, user_ids):
+        keys = {self.key(user_id): user_id for user_id in user_ids}
+        timelines = cache.get_many(keys)
+        # Холодные ленты не трогаем: они соберутся при первом чтении.
+        cache.set_many(
+            {
+                key: [(post.id, post.author_id)] + entries[:self.size - 1]
+                for key, entries in timelines.items()
+            },
+            None,
+        )
+
+    def backfill(self, user_id, author_id):
+        # Порядок ленты зависит от дат чужих постов, поэтому при новой
+        # подписке проще собрать её заново.
+        self.rebuild(user_id)
+
+    def prune(self, user_id, author_id):
+        entries = cache.get(self.key(user_id))
+        if entries is not None:
+            cache.set(
+                self.key(user_id),
+                [entry for entry in entries if entry[1] != author_id],
+                None,
+            )
+
+    def rebuild(self, user_id):
+        rows = self.latest_posts(user_id)
+        self._store(user_id, rows)
+        return [post_id for post_id, _, _ in rows]
+
+    def post_ids(self, user_id):
+        entries = cache.get(self.key(user_id))
+        if entries is None:
+            return self.rebuild(user_id)
+        return [post_id for post_id, _ in entries]
+
+
+BACKENDS = {
+    'db': DatabaseTimeline,
+    'cache': CacheTimeline,
+}
+
+
+def get_timeline():
+    backend = settings.FOLLOW_TIMELINE_BACKEND
+    if not backend:
+        return None
+    return BACKENDS[backend]()
+
+
+def fan_out(post):
+    timeline = get_timeline()
+    if timeline is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    timeline.push(post, list(followers))
+
+
+def timeline_post_ids(user_id):
+    """id постов из готовой ленты или None, если ленту нужно строить
+    запросом: бэкенд выключен или подписок слишком много."""
+    timeline = get_timeline()
+    if timeline is None:
+        return None
+    following = Follow.objects.filter(user_id=user_id).count()
+    if following > settings.FOLLOW_TIMELINE_MAX_FOLLOWING:
+        return None
+    return timeline.post_ids(user_id)
@@ -0,0 +1,107 @@
+"""Потоковая обработка загружаемых картинок постов.
+
+Файл сразу пишется во временный файл на диске, без буфера в памяти.
+Лимит размера проверяется по мере приёма данных, а лимит пикселей -
+по заголовку картинки, до того как Pillow раскодирует её целиком.
+Отклонённый файл дочитывается и отбрасывается, а в форму попадает
+RejectedUpload с текстом ошибки.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+# Сколько первых байт файла читать в поисках размеров картинки
+HEADER_BYTES = 256 * 1024
+
+
+class RejectedUpload(UploadedFile):
+    def __init__(self, name, content_type, upload_error):
+        super().__init__(BytesIO(), name, content_type, 0)
+        self.upload_error = upload_error
+
+
+class PostImageUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.header_checked = False
+        self.upload_error = None
+        if self.content_length and (
+                self.content_length > settings.POST_IMAGE_MAX_BYTES):
+            self.reject_size()
+
+    def reject(self, upload_error):
+        self.upload_error = upload_error
+        self.file.close()
+
+    def reject_size(self):
+        self.reject(
+            'Файл слишком большой: максимум '
+            f'{settings.POST_IMAGE_MAX_BYTES // 1024 // 1024} МБ.')
+
+    def check_header(self, raw_data):
+        self.header += raw_data
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            width, height = float('inf'), 1
+        except Exception:
+            # Заголовок ещё не пришёл целиком или это не картинка:
+            # во втором случае файл отклонит валидация формы.
+            if len(self.header) >= HEADER_BYTES:
+                self.header_checked = True
+                self.header = b''
+            return
+        self.header_checked = True
+        self.header = b''
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject(
+                'Слишком большое разрешение: максимум '
+                f'{settings.POST_IMAGE_MAX_PIXELS // 1_000_000} Мп.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.upload_error:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            self.reject_size()
+            return None
+        if not self.header_checked:
+            self.check_header(raw_data)
+            if self.upload_error:
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.upload_error:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.upload_error)
+        file = super().file_complete(file_size)
+        strip_exif(file)
+        return file
+
+
+def strip_exif(file):
+    """Удаляет EXIF (геометки, модель камеры) из файла на месте.
+    Поворот из EXIF применяется к пикселям, чтобы картинка не легла
+    на бок."""
+    file.seek(0)
+    try:
+        with Image.open(file) as image:
+            if not image.getexif():
+                return
+            image_format = image.format
+            image = ImageOps.exif_transpose(image)
+    except Exception:
+        return
+    finally:
+        file.seek(0)
+    file.truncate()
+    image.save(file, image_format, quality=95, exif=b'')
+    file.size = file.tell()
+    file.seek(0)
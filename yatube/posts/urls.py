@@ -1,14 +1,24 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 app_name = 'posts'
 
+# Под ASGI ленты отдают async-версии view (см. yatube/asgi.py).
+feeds = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.index, name='index'),
-    path('group/<slug:slug>/', views.group_posts, name='group_posts'),
-    path('profile/<str:username>/', views.profile, name='profile'),
-    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('', feeds.index, name='index'),
+    path('group/<slug:slug>/', feeds.group_posts, name='group_posts'),
+    path('profile/<str:username>/', feeds.profile, name='profile'),
+    path('posts/<int:post_id>/', feeds.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('search/', views.search, name='search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -16,7 +26,7 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
-    path('follow/', views.follow_index, name='follow_index'),
+    path('follow/', feeds.follow_index, name='follow_index'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
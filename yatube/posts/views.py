@@ -1,48 +1,101 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.http import urlencode
 
-from yatube.settings import COUNT_POST_FOR_PAGE
+from core.db import read_from_replica
+from yatube.settings import (COUNT_COMMENTS_FOR_PAGE, COUNT_POST_FOR_PAGE,
+                             FEED_CACHE_TIMEOUT, FEED_PAGINATION)
 
+from . import caching
+from .conditional import (conditional_page, group_scopes, index_scopes,
+                          post_scopes, profile_scopes)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
-
-
-def include_paginator(request, db_object):
+from .images import schedule_images
+from .models import AuthorStats, Comment, Follow, Group, Post
+from .paginator import CursorPaginator
+from .search import get_search
+from .timeline import timeline_post_ids
+from .writebehind import get_queue, wait_written
+
+
+def include_paginator(request, db_object, count=None):
+    cursor = request.GET.get('cursor')
+    if cursor or (FEED_PAGINATION == 'cursor' and 'page' not in request.GET):
+        paginator = CursorPaginator(db_object, COUNT_POST_FOR_PAGE)
+        return paginator.get_page(cursor)
     paginator = Paginator(db_object, COUNT_POST_FOR_PAGE)
+    if count is not None:
+        paginator.count = count
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def redirect_written(to, written, **kwargs):
+    """redirect на страницу; если запись ещё в очереди WRITE_BEHIND -
+    с меткой, по которой страница её дождётся."""
+    url = reverse(to, kwargs=kwargs)
+    if written:
+        url += '?' + urlencode({'written': written})
+    return redirect(url)
+
+
+def comments_page(post_id, cursor=None):
+    """Страница комментариев поста от старых к новым, с авторами."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').only('text', 'created', 'post_id', 'author__username')
+    paginator = CursorPaginator(
+        comments, COUNT_COMMENTS_FOR_PAGE, ordering=('created', 'id'))
+    return paginator.get_page(cursor)
+
+
+@read_from_replica
+@conditional_page(index_scopes, feed=True)
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     page_obj = include_paginator(request, post_list)
 
     context = {
         'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=True),
+        'feed_version': caching.feed_version(('global',)),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_from_replica
+@conditional_page(group_scopes, feed=True)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed()
     page_obj = include_paginator(request, post_list)
 
     context = {
         'group': group,
         'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=False),
+        'feed_version': caching.feed_version(('group', group.id)),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@read_from_replica
+@conditional_page(profile_scopes, feed=True)
 def profile(request, username):
+    wait_written(request.GET.get('written'))
     author = get_object_or_404(User, username=username)
-    count_posts = author.posts.all().count()
-    posts = author.posts.all()
-    page_obj = include_paginator(request, posts)
+    count_posts = AuthorStats.get_posts_count(author.id)
+    posts = author.posts.for_feed()
+    page_obj = include_paginator(request, posts, count=count_posts)
 
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user).filter(author=author).exists()
@@ -51,16 +104,23 @@ def profile(request, username):
         'author': author,
         'count_posts': count_posts,
         'page_obj': page_obj,
+        'post_cards': caching.PostCards(
+            page_obj, template='posts/includes/profile_card.html'),
         'following': following,
+        'feed_version': caching.feed_version(('author', author.id)),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+@conditional_page(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    author = post.author
-    count_posts = author.posts.all().count()
-    comments = Comment.objects.filter(post_id=post_id)
+    wait_written(request.GET.get('written'))
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id)
+    count_posts = AuthorStats.get_posts_count(post.author_id)
+    comments = comments_page(post_id, request.GET.get('cursor'))
     form = CommentForm(request.POST or None)
 
     context = {
@@ -72,6 +132,32 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев для подгрузки на странице поста:
+    HTML-фрагмент и курсор следующей страницы."""
+    comments = comments_page(post_id, request.GET.get('cursor'))
+    html = render_to_string(
+        'posts/includes/comments.html', {'comments': comments}, request)
+    return JsonResponse({'html': html, 'next_cursor': comments.next_cursor})
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    backend = get_search()
+    post_list = backend.search(Post.objects.for_feed(), query)
+    paginator = CursorPaginator(
+        post_list, COUNT_POST_FOR_PAGE, ordering=backend.ordering)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=True),
+        'paginator_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @ login_required
 def post_create(request):
     form = PostForm(
@@ -81,7 +167,9 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            schedule_images(post)
         return redirect('posts:profile', request.user)
     return render(request, 'posts/create_post.html', {'form': form})
 
@@ -101,7 +189,13 @@ def post_edit(request, post_id):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
+        post.version = F('version') + 1
+        if 'image' in form.changed_data:
+            post.thumbnail = ''
+            post.image_variants = []
         post.save()
+        if 'image' in form.changed_data:
+            schedule_images(post)
         return redirect('posts:post_detail', post.id)
 
     context = {
@@ -116,20 +210,34 @@ def post_edit(request, post_id):
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
+    written = None
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
-    return redirect('posts:post_detail', post_id=post_id)
+        queue = get_queue()
+        if queue is None:
+            comment.save()
+        else:
+            written = queue.save(comment)
+    return redirect_written('posts:post_detail', written, post_id=post_id)
 
 
 @ login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_ids = timeline_post_ids(request.user.id)
+    if post_ids is None:
+        post_list = Post.objects.for_feed().filter(
+            author__following__user=request.user)
+    else:
+        post_list = Post.objects.for_feed().filter(id__in=post_ids)
     page_obj = include_paginator(request, post_list)
     context = {
         'page_obj': page_obj,
+        'post_cards': caching.PostCards(page_obj, show_group_link=True),
+        'feed_version': caching.feed_version(
+            ('global',), ('follow', request.user.id)),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -139,11 +247,17 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author == request.user:
         return redirect('posts:profile', username=username)
-    Follow.objects.get_or_create(
-        user=request.user,
-        author=author
-    )
-    return redirect('posts:profile', username=username)
+    queue = get_queue()
+    if queue is None:
+        Follow.objects.get_or_create(
+            user=request.user,
+            author=author
+        )
+        written = None
+    else:
+        # Повторную подписку bulk_create пропустит по unique_follow.
+        written = queue.save(Follow(user=request.user, author=author))
+    return redirect_written('posts:profile', written, username=username)
 
 
 @ login_required
@@ -0,0 +1,288 @@
+"""Отложенная запись комментариев и подписок пачками (write-behind).
+
+При всплеске записи (сотни комментариев в секунду к одному посту)
+отдельная транзакция на каждый запрос упирается в единственного писателя
+SQLite. С включённым WRITE_BEHIND views проверяют данные сразу, а объекты
+кладут в очередь процесса. Очередь пишет их одной транзакцией:
+bulk_create(ignore_conflicts=True) на модель, не позже чем через
+WRITE_BEHIND_FLUSH_INTERVAL секунд после первой записи в буфере или сразу
+по накоплении WRITE_BEHIND_BATCH_SIZE объектов.
+
+Режимы WRITE_BEHIND:
+    'commit' - запрос ждёт коммита пачки со своей записью (group commit):
+               записи не теряются, ответ задерживается не больше чем на
+               интервал;
+    'async'  - ответ уходит сразу, пачки пишет фоновый поток; при падении
+               процесса незаписанный буфер теряется.
+
+Если пачка не записалась (например, database is locked), в режиме
+'commit' ошибку получает каждый запрос пачки, а в режиме 'async' пачка
+возвращается в начало очереди и пишется повторно - до WRITE_ATTEMPTS
+попыток, после чего записи отбрасываются с ошибкой в логе. Записи,
+нарушившие целостность (пост удалили после проверки), не повторяются.
+
+bulk_create не отправляет сигналы, поэтому их действия - счётчики
+комментариев, ленты подписок, сброс кэша лент, метрики - выполняются
+здесь, по разу на пачку.
+
+Чтобы автор сразу увидел свою запись, в режиме 'async' view перенаправляет
+на страницу с параметром written, и страница вызывает wait_written.
+Метки ожидающих записей лежат в кэше, поэтому с общим кэшем
+(YATUBE_CACHE_URL) ожидание работает и между воркерами.
+"""
+import atexit
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+
+from core.db import pin_to_primary
+
+from . import caching
+from .metrics import COMMENTS_CREATED, WRITE_BATCH_SIZE
+from .models import Comment, Follow, Post
+from .timeline import get_timeline
+
+logger = logging.getLogger(__name__)
+
+PENDING_PREFIX = 'write_behind'
+# Сколько хранится метка ожидающей записи и сколько страница её ждёт, сек.
+PENDING_TIMEOUT = 60
+WAIT_TIMEOUT = 2
+# Сколько раз фоновый поток пробует записать запись.
+WRITE_ATTEMPTS = 5
+TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def pending_key(token):
+    return f'{PENDING_PREFIX}:{token}'
+
+
+class Item:
+    def __init__(self, obj):
+        self.obj = obj
+        self.token = uuid.uuid4().hex
+        self.queued = time.monotonic()
+        self.done = threading.Event()
+        self.error = None
+        self.attempts = 0
+
+    @property
+    def retryable(self):
+        """Не записана из-за ошибки базы, а не данных."""
+        return (self.error is not None
+                and not isinstance(self.error, IntegrityError))
+
+
+class WriteBehindQueue:
+    def __init__(self):
+        self.items = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        # Пачки пишутся по одной: и фоновым потоком, и запросами.
+        self.flush_lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(
+                target=self.run, name='write-behind', daemon=True)
+            self.thread.start()
+        atexit.register(self.flush)
+
+    def put(self, obj, mark=False):
+        item = Item(obj)
+        if mark:
+            cache.set(pending_key(item.token), True, PENDING_TIMEOUT)
+        with self.lock:
+            self.items.append(item)
+            full = len(self.items) >= settings.WRITE_BEHIND_BATCH_SIZE
+            self.wakeup.notify()
+        if full and self.thread is None:
+            self.flush()
+        return item
+
+    def save(self, obj):
+        """Ставит obj в очередь. Возвращает метку для wait_written, если
+        ответ уходит раньше, чем запись окажется в базе."""
+        # Пачку может записать другой поток: роутер этого не увидит.
+        pin_to_primary()
+        if settings.WRITE_BEHIND == 'async':
+            self.start()
+            return self.put(obj, mark=True).token
+        item = self.put(obj)
+        # Кто первым дождался конца интервала, тот и пишет всю пачку.
+        if not item.done.wait(settings.WRITE_BEHIND_FLUSH_INTERVAL):
+            self.flush()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return None
+
+    def pending(self, token):
+        with self.lock:
+            return any(item.token == token for item in self.items)
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.items:
+                    self.wakeup.wait()
+                deadline = (self.items[0].queued
+                            + settings.WRITE_BEHIND_FLUSH_INTERVAL)
+                while len(self.items) < settings.WRITE_BEHIND_BATCH_SIZE:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.wakeup.wait(remaining)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать пачку')
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                items, self.items = self.items, []
+            if not items:
+                return
+            objects = write(items)
+            if objects:
+                try:
+                    after_insert(objects)
+                except Exception:
+                    # Записи уже в базе: повтор создал бы дубликаты.
+                    logger.exception('Не удалось обработать пачку')
+            if settings.WRITE_BEHIND == 'async':
+                items = self.requeue(items)
+            cache.delete_many([pending_key(item.token) for item in items])
+            for item in items:
+                item.done.set()
+
+    def requeue(self, items):
+        """Возвращает в начало очереди записи, которые стоит повторить;
+        возвращает остальные."""
+        done, retry = [], []
+        for item in items:
+            if item.retryable:
+                item.attempts += 1
+            if item.retryable and item.attempts < WRITE_ATTEMPTS:
+                item.error = None
+                # Следующая попытка - не раньше чем через интервал.
+                item.queued = time.monotonic()
+                retry.append(item)
+            else:
+                if item.retryable:
+                    logger.error('Запись %r отброшена после %d попыток: %s',
+                                 item.obj, item.attempts, item.error)
+                done.append(item)
+        if retry:
+            with self.lock:
+                self.items[:0] = retry
+        return done
+
+
+def write(items):
+    """Пишет пачку и возвращает записанные объекты; незаписанным
+    записям ставит error."""
+    WRITE_BATCH_SIZE.observe(len(items))
+    objects = [item.obj for item in items]
+    try:
+        with transaction.atomic():
+            insert(objects)
+    except IntegrityError:
+        pass
+    except Exception as error:
+        # Транзакция откатилась целиком: пачку можно повторить.
+        logger.warning('Пачка из %d записей не записана: %s',
+                       len(items), error)
+        for item in items:
+            item.error = error
+        return []
+    else:
+        return objects
+    # Например, пост удалили после проверки: пишем по одному, чтобы
+    # одна строка не потянула за собой всю пачку.
+    objects = []
+    for item in items:
+        try:
+            with transaction.atomic():
+                insert([item.obj])
+        except Exception as error:
+            item.error = error
+            logger.warning('Запись %r не записана: %s', item.obj, error)
+        else:
+            objects.append(item.obj)
+    return objects
+
+
+def insert(objects):
+    by_model = defaultdict(list)
+    for obj in objects:
+        by_model[type(obj)].append(obj)
+    for model, model_objects in by_model.items():
+        model.objects.bulk_create(model_objects, ignore_conflicts=True)
+    comments = by_model[Comment]
+    created = defaultdict(list)
+    for comment in comments:
+        created[comment.post_id].append(comment.created)
+    for post_id, dates in created.items():
+        Post.comment_added(post_id, max(dates), count=len(dates))
+
+
+def after_insert(objects):
+    """То, что при обычном сохранении делают сигналы post_save."""
+    scopes = set()
+    comments = [obj for obj in objects if isinstance(obj, Comment)]
+    if comments:
+        COMMENTS_CREATED.inc(len(comments))
+        # Как и comment_saved, ленты не сбрасываются.
+        scopes |= {('post', comment.post_id) for comment in comments}
+    timeline = get_timeline()
+    for follow in objects:
+        if not isinstance(follow, Follow):
+            continue
+        # Повторная подписка пропущена bulk_create, а backfill
+        # идемпотентен, так что его можно выполнить и для неё.
+        if timeline is not None:
+            timeline.backfill(follow.user_id, follow.author_id)
+        scopes.add(('follow', follow.user_id))
+    if scopes:
+        caching.bump(*scopes)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """Очередь процесса или None, если WRITE_BEHIND выключен."""
+    global _queue
+    if not settings.WRITE_BEHIND:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteBehindQueue()
+        return _queue
+
+
+def wait_written(token):
+    """Ждёт, пока запись с меткой token из save() окажется в базе."""
+    if not token or not TOKEN_RE.match(token):
+        return
+    if _queue is not None and _queue.pending(token):
+        # Запись в очереди этого процесса: проще записать её сразу.
+        _queue.flush()
+        return
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while cache.get(pending_key(token)) and time.monotonic() < deadline:
+        time.sleep(0.01)
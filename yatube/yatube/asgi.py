@@ -0,0 +1,27 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Feed pages are served by the async views from posts/async_views.py.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+os.environ.setdefault('YATUBE_ASYNC_VIEWS', '1')
+
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # Django 3.2 runs thread-sensitive code (synchronous middleware hooks,
+    # signals) of all requests in one shared thread; a context per request
+    # gives each request its own thread, as newer Django versions do.
+    async with ThreadSensitiveContext():
+        return await django_application(scope, receive, send)
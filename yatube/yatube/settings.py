@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from core.cache import cache_settings
+from core.db import replica_settings, sqlite_settings
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -46,6 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +62,14 @@ MIDDLEWARE = [
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Async-версии лент (posts/async_views.py); включает yatube/asgi.py
+ASYNC_VIEWS = bool(os.getenv('YATUBE_ASYNC_VIEWS'))
+if ASYNC_VIEWS:
+    # django-debug-toolbar 3.2 работает только синхронно: под ASGI его
+    # middleware пропускало бы все запросы через один поток
+    INSTALLED_APPS.remove('debug_toolbar')
+    MIDDLEWARE.remove('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
@@ -81,12 +95,19 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль SQLite: YATUBE_DB_PROFILE=production включает WAL, долгоживущие
+# соединения и ожидание блокировок (см. core/db.py)
+DB_PROFILE = os.getenv('YATUBE_DB_PROFILE', '')
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    'default': sqlite_settings(
+        os.path.join(BASE_DIR, 'db.sqlite3'), DB_PROFILE),
+    # Пути к репликам через запятую: ленты читаются с них
+    **replica_settings(os.getenv('YATUBE_DB_REPLICAS', ''), DB_PROFILE),
 }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# Сколько секунд после записи пользователь читает с основной базы
+DB_PIN_SECONDS = 10
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -142,21 +163,115 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 # Количество записей на страницу
 COUNT_POST_FOR_PAGE = 10
+# Режим пагинации лент: 'cursor' - keyset по (pub_date, id) через ?cursor=,
+# 'page' - классический Paginator. Параметр ?page= работает в обоих режимах.
+FEED_PAGINATION = 'cursor'
+# Количество комментариев на странице поста и в каждой подгрузке
+COUNT_COMMENTS_FOR_PAGE = 20
+
+# Поиск по постам (posts/search.py): 'sqlite', 'postgresql', 'like'
+# или None - по СУБД подключения.
+POST_SEARCH_BACKEND = None
+# Сколько слов запроса учитывать
+POST_SEARCH_MAX_WORDS = 10
+
+# Лента подписок с раскладкой постов при публикации (fan-out on write):
+# 'db', 'cache' или None - строить ленту запросом при каждом чтении.
+FOLLOW_TIMELINE_BACKEND = None
+# Сколько последних постов хранится в ленте одного пользователя
+FOLLOW_TIMELINE_SIZE = 500
+# При большем числе подписок лента строится запросом
+FOLLOW_TIMELINE_MAX_FOLLOWING = 300
+
+# Отложенная запись комментариев и подписок пачками (posts/writebehind.py):
+# None - сразу в запросе; 'commit' - запрос ждёт общую транзакцию пачки;
+# 'async' - ответ сразу, пачки пишет фоновый поток (при падении процесса
+# незаписанный буфер теряется)
+WRITE_BEHIND = os.getenv('YATUBE_WRITE_BEHIND') or None
+# Самое большее через столько секунд запись попадает в базу
+WRITE_BEHIND_FLUSH_INTERVAL = 0.05
+# Пачка пишется сразу, если набралось столько записей
+WRITE_BEHIND_BATCH_SIZE = 500
+
+# Время жизни кэша лент, сек. Устаревшие фрагменты не показываются:
+# ключи меняются при каждом изменении постов (см. posts/caching.py)
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Время жизни кэша отрендеренных карточек постов, сек.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Время жизни кэша целых страниц для анонимных читателей, сек. Ключ
+# меняется при изменении данных страницы (см. posts/conditional.py)
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Комментарии сбрасывают кэш только страницы поста; число комментариев
+# в карточках лент отстаёт не больше чем на столько секунд
+COMMENT_COUNT_MAX_AGE = 60
 
 # Папка для хранения файлов пользователей
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Миниатюры картинок постов: размер, качество JPEG и число фоновых потоков,
+# которые их генерируют. При 0 миниатюра создаётся прямо в запросе.
+POST_THUMBNAIL_SIZE = (960, 339)
+POST_THUMBNAIL_QUALITY = 85
+POST_IMAGE_WORKERS = 2
+# Ширины и форматы вариантов картинки для srcset. Форматы, которые
+# не поддерживает установленный Pillow (например, avif), пропускаются.
+POST_IMAGE_WIDTHS = (480, 960)
+POST_IMAGE_FORMATS = ('avif', 'webp', 'jpeg')
+
+# Загрузки пишутся сразу во временный файл и проверяются на лету:
+# размер - по принятым байтам, разрешение - по заголовку картинки
+FILE_UPLOAD_HANDLERS = ['posts.uploadhandlers.PostImageUploadHandler']
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
 # csrf_failure
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 # Подключаем Кэш
+# Общий кэш для всех воркеров: redis://host:6379/0 или memcached://host:11211.
+# Без YATUBE_CACHE_URL используется локальный кэш процесса (см. core/cache.py)
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache_settings(
+        os.getenv('YATUBE_CACHE_URL', ''),
+        key_prefix=os.getenv('YATUBE_CACHE_KEY_PREFIX', 'yatube'),
+        max_connections=int(os.getenv('YATUBE_CACHE_MAX_CONNECTIONS', 50)),
+    )
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Замер производительности запросов (core/middleware.py): доля запросов
+# в выборке, от 0 (выключено) до 1 (все запросы)
+PERFORMANCE_SAMPLE_RATE = float(
+    os.getenv('YATUBE_PERFORMANCE_SAMPLE_RATE', 0))
+# Отдавать замеры в заголовке Server-Timing (видны в DevTools браузера)
+PERFORMANCE_SERVER_TIMING = True
+
+# Метрики Prometheus на /metrics (core/metrics.py). С несколькими
+# воркерами gunicorn задайте общий каталог YATUBE_METRICS_DIR, иначе
+# каждый ответ покажет метрики только одного воркера
+METRICS_DIR = os.getenv('YATUBE_METRICS_DIR', '')
+# Как часто воркер записывает свои метрики в каталог, секунд
+METRICS_FLUSH_INTERVAL = 5
+# Если задан, /metrics требует заголовок Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.performance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}